@@ -1,50 +1,99 @@
 from fastapi import FastAPI, Request, Response
 from fastapi.responses import JSONResponse
-import jwt
-from jwt.exceptions import InvalidTokenError
 from dotenv import load_dotenv
-import os
 import json
-import requests
+import math
+import asyncio
 from datetime import date
+from contextlib import asynccontextmanager
 
-from chatbot_service.chat import Model
-from function_calling_service import response_AI
+from chatbot_service.chat import models, CHAT_BATCH_MAX
+from function_calling_service import response_AI, response_AI_stream
 from function_calling_service.register import FunctionRegistry
-from function_calling_service.function import get_expense_by_amount
+from function_calling_service.function import get_expense_by_amount, registry
+from function_calling_service import backend
+from llm_service import llm_client, llm_cache, sessions, stages, warmup, ModelUnavailable, SchedulerRejected
+from api_gateway.sse import sse_response
+from api_gateway.auth import AuthMiddleware
+from api_gateway.timing import TimingMiddleware
+from common.context import user_id
+from common import log
+from common.metrics import SCHEDULER_QUEUED, SCHEDULER_RUNNING
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    llm_client.start()
+    # fixed priority, not measured use: tool selection runs on every /ask, then the chat prompts.
+    # Warm-up keeps only as many prefixes per model as a node has slots
+    prompts = [registry.warmup_prompt(), *models.warmup_prompts()]
+    warmup.configure(stages.all_models(), prompts)
+    # the server answers /health with 503 until the models are loaded
+    warming = asyncio.create_task(warmup.run())
+    yield
+    warming.cancel()
+    await llm_client.aclose()
+    await backend.aclose()
+    log.stop()
 
-@app.middleware("http")
-async def authenticate(req: Request, next):
-    token = req.headers.get("Authorization")
-    if not token:
-        return Response(status_code=400, content=json.dumps({
-            "code": "400",
-            "message": "Token is required",
-            "metadata": None
-        }))
-    # remove Bearer
-    token = token.split(" ")[-1]
+app = FastAPI(lifespan=lifespan)
 
-    try:
-        decodeUser = jwt.decode(token, os.getenv("JWT_SECRET_ACCESS"), algorithms=["HS256"])
-        req.state.user = decodeUser
+app.add_middleware(AuthMiddleware, exempt_paths=("/health", "/metrics"))
+# added last so it wraps the auth middleware and times it too
+app.add_middleware(TimingMiddleware)
 
-        return await next(req)
-    except InvalidTokenError:
-        return Response(status_code=400, content=json.dumps({
-            "code": "400",
-            "message": "Invalid token",
-            "metadata": None
-        }))
+@app.exception_handler(SchedulerRejected)
+@app.exception_handler(ModelUnavailable)
+async def scheduler_rejected(req: Request, exc: SchedulerRejected):
+    return Response(status_code=exc.status_code, headers={"Retry-After": str(math.ceil(exc.retry_after))}, content=json.dumps({
+        "code": exc.status_code,
+        "message": str(exc),
+        "metadata": None
+    }))
 
 @app.get("/")
 def index():
     return "Hello world"
 
+@app.get("/health")
+def health():
+    """
+        Readiness for the load balancer: models warmed up and at least one Ollama node healthy
+    """
+    nodes = llm_client.pool.stats()
+    ready = warmup.ready and any(node["healthy"] for node in nodes)
+    status = 200 if ready else 503
+    return JSONResponse(status_code=status, content={
+        "code": status,
+        "message": "Ready" if ready else "Warming up",
+        "metadata": {"warmup": warmup.stats(), "ollama": nodes}
+    })
+
+SCHEDULER_RUNNING.set_function(lambda: llm_client.scheduler.running)
+SCHEDULER_QUEUED.set_function(lambda: llm_client.scheduler.queued)
+
+@app.get("/metrics")
+def metrics():
+    """
+        Prometheus scrape endpoint, no token so the scraper can reach it
+    """
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/stats")
+def stats():
+    return {
+        "code": 200,
+        "message": "Stats",
+        "metadata": {
+            "llm_cache": llm_cache.stats(),
+            "scheduler": llm_client.scheduler.stats(),
+            "ollama": llm_client.pool.stats(),
+            "stages": stages.stats()
+        }
+    }
+
 @app.post("/chat")
 async def chat(req: Request):
     data = await req.json()
@@ -58,16 +107,40 @@ async def chat(req: Request):
             "metadata": None
         }))
     
-    # init personality for chatbot
-    chatbot = Model(personality)
+    chatbot = models.get(personality)
 
-    response = chatbot.ask_model(query)
+    response = await chatbot.ask_model(query)
     return {
         "code": 200,
         "message": "Recieved response",
         "metadata": response
     }
     
+@app.post("/chat/batch")
+async def chat_batch(req: Request):
+    """
+        Classify many pasted or imported transaction lines at once, results in input order
+    """
+    data = await req.json()
+    queries = data.get('queries')
+
+    if not isinstance(queries, list) or not queries or len(queries) > CHAT_BATCH_MAX \
+            or not all(isinstance(query, str) and query.strip() for query in queries):
+        return Response(status_code=400, content=json.dumps({
+            "code": 400,
+            "message": f"queries must be a list of 1 to {CHAT_BATCH_MAX} messages",
+            "metadata": None
+        }))
+
+    chatbot = models.get(data.get('personality'))
+
+    response = await chatbot.ask_batch(queries)
+    return {
+        "code": 200,
+        "message": "Recieved response",
+        "metadata": response
+    }
+
 @app.post("/ask")
 async def askAI(req: Request):
     data = await req.json()
@@ -86,19 +159,67 @@ async def askAI(req: Request):
         "metadata": response
     }
 
-@app.get("/test")
-def get_expenses(req: Request, page: int = 1, pageSize: int = 5):
-    accessToken = req.headers.get("Authorization")
-    headers = {
-        "Content-Type": "application/json",
-        'Authorization': f'Bearer {accessToken}'
+@app.post("/chat/stream")
+async def chat_stream(req: Request):
+    data = await req.json()
+    query = data['query']
+    personality = data['personality']
+
+    if not query or not personality:
+        return Response(status_code=400, content=json.dumps({
+            "code": 400,
+            "message": "Query and personality is required",
+            "metadata": None
+        }))
+
+    chatbot = models.get(personality)
+    return sse_response(chatbot.ask_model_stream(query))
+
+@app.post("/ask/stream")
+async def askAI_stream(req: Request):
+    data = await req.json()
+    query = data['query']
+    if not query:
+        return Response(status_code=400, content=json.dumps({
+            "code": 400,
+            "message": "Query is required",
+            "metadata": None
+        }))
+    return sse_response(response_AI_stream(query, req))
+
+@app.post("/cache/invalidate")
+async def invalidate_cache(req: Request):
+    """
+        Called by the backend with the user's token after the user records a new transaction
+    """
+    uid = user_id(req.state.user)
+    removed = backend.invalidate_user(uid) if uid else 0
+    return {
+        "code": 200,
+        "message": "Cache invalidated",
+        "metadata": {"removed": removed}
     }
+
+@app.post("/session/reset")
+async def reset_session(req: Request):
+    """
+        Forget the conversation history of the user, the next message starts a new conversation
+    """
+    uid = user_id(req.state.user)
+    removed = sessions.reset(uid) if uid else 0
+    return {
+        "code": 200,
+        "message": "Session reset",
+        "metadata": {"removed": removed}
+    }
+
+@app.get("/test")
+async def get_expenses(req: Request, page: int = 1, pageSize: int = 5):
     params = {
         "page": page,
         "pageSize": pageSize
     }
-    response = requests.get(f"http://localhost:3000/expense/get-expense", headers=headers, params=params)
-    response_json = response.json()
+    response_json = await backend.get_json(req, "/expense/get-expense", params)
 
     results = []
     expenses_list = response_json['metadata']['Expenses']
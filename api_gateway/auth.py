@@ -0,0 +1,84 @@
+from fastapi import Response
+from cachetools import LRUCache
+from jwt.exceptions import InvalidTokenError
+from dotenv import load_dotenv
+from typing import Optional
+from common.context import current_user
+from common.timing import span
+import jwt
+import json
+import time
+import os
+
+load_dotenv()
+
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", 10000))
+
+
+class TokenVerifier:
+    def __init__(self, secret: Optional[str] = None, size: int = AUTH_CACHE_SIZE):
+        """
+            Verify HS256 access tokens, remembering verified ones while they are valid
+        """
+        self.secret = secret if secret is not None else os.getenv("JWT_SECRET_ACCESS")
+        self.cache = LRUCache(maxsize=size)  # token -> (claims, exp, nbf)
+
+    def verify(self, token: str) -> dict:
+        entry = self.cache.get(token)
+        if entry is not None:
+            claims, exp, nbf = entry
+            now = time.time()
+            if (exp is None or exp > now) and (nbf is None or nbf <= now):
+                return claims
+            # jwt.decode below raises the matching error
+            del self.cache[token]
+
+        claims = jwt.decode(token, self.secret, algorithms=["HS256"])
+        self.cache[token] = (claims, claims.get("exp"), claims.get("nbf"))
+        return claims
+
+
+def error_response(message: str) -> Response:
+    return Response(status_code=400, content=json.dumps({
+        "code": "400",
+        "message": message,
+        "metadata": None
+    }))
+
+
+class AuthMiddleware:
+    def __init__(self, app, verifier: TokenVerifier = None, exempt_paths: tuple = ()):
+        """
+            Pure ASGI middleware putting the decoded user in req.state.user
+        """
+        self.app = app
+        self.verifier = verifier or TokenVerifier()
+        self.exempt_paths = set(exempt_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        token = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                token = value.decode("latin-1")
+                break
+
+        if not token:
+            await error_response("Token is required")(scope, receive, send)
+            return
+        # remove Bearer
+        token = token.split(" ")[-1]
+
+        try:
+            with span("auth"):
+                user = self.verifier.verify(token)
+        except InvalidTokenError:
+            await error_response("Invalid token")(scope, receive, send)
+            return
+
+        scope.setdefault("state", {})["user"] = user
+        current_user.set(user)
+        await self.app(scope, receive, send)
@@ -0,0 +1,23 @@
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Tuple, Any
+import json
+
+def format_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def sse_response(events: AsyncIterator[Tuple[str, Any]]) -> StreamingResponse:
+    """
+        Forward (event, data) pairs as Server-Sent Events, an exception ends the stream with an "error" event
+    """
+    async def body():
+        try:
+            async for event, data in events:
+                yield format_event(event, data)
+        except Exception as e:
+            yield format_event("error", {"code": getattr(e, "status_code", 500), "message": str(e)})
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,60 @@
+from common.timing import Trace, current_trace, server_timing
+from common.metrics import REQUEST_SECONDS
+from common.log import get_logger
+from dotenv import load_dotenv
+import random
+import json
+import time
+import os
+
+load_dotenv()
+
+# share of requests whose spans are written to the log, 0 to disable
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0))
+
+log = get_logger("trace")
+
+
+class TimingMiddleware:
+    def __init__(self, app, sample_rate: float = TRACE_SAMPLE_RATE):
+        """
+            Pure ASGI middleware collecting the request's spans into a Server-Timing header,
+            the request histogram and, for a sample of requests, the trace log
+        """
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace()
+        current_trace.set(trace)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            # streamed responses only report what happened before the first byte
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                trace.timings["total"] = time.perf_counter() - trace.start
+                headers = [*message.get("headers", []), (b"server-timing", server_timing(trace.timings).encode("latin-1"))]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - trace.start
+            # the route template keeps the label set bounded, unknown paths share one label
+            route = scope.get("route")
+            REQUEST_SECONDS.labels(scope["method"], getattr(route, "path", "other"), str(status)).observe(elapsed)
+            if self.sample_rate and random.random() < self.sample_rate:
+                log.info(json.dumps({
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status,
+                    "ms": round(elapsed * 1000, 1),
+                    "spans": trace.spans
+                }, ensure_ascii=False, default=str))
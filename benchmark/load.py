@@ -0,0 +1,157 @@
+from dataclasses import dataclass, field
+from collections import Counter, defaultdict
+from typing import Dict, List
+import argparse
+import asyncio
+import random
+import time
+import httpx
+import jwt
+import os
+
+# mixed workload: /ask questions go through routing, tools and summary, /chat messages through classification
+ASK_QUERIES = [
+    "chi tiêu gần đây",
+    "khoản chi lớn nhất của tôi",
+    "khoản chi nhỏ nhất",
+    "tổng chi tiêu theo hạng mục",
+    "tổng chi theo tháng",
+    "chi tiêu hạng mục ăn uống",
+    "đối tác giao dịch nhiều nhất",
+    "tìm giao dịch grab",
+]
+CHAT_QUERIES = [
+    "ăn phở 50k",
+    "đổ xăng 80 nghìn",
+    "mua áo 350k",
+    "nhận lương 15tr",
+    "trả tiền điện 1tr2",
+    "cà phê với bạn 45k",
+    "đi grab 32k",
+    "mua thuốc 120k",
+]
+PERSONALITIES = ["humor", "expert", "motivational", "empathetic"]
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """
+        "auth;dur=0.3, routing;dur=812.0" -> {"auth": 0.0003, "routing": 0.812}
+    """
+    timings = {}
+    for part in header.split(","):
+        name, _, rest = part.strip().partition(";")
+        if rest.startswith("dur="):
+            timings[name] = float(rest[4:]) / 1000
+    return timings
+
+
+@dataclass
+class Result:
+    concurrency: int
+    duration: float = 0.0
+    latencies: Dict[str, List[float]] = field(default_factory=lambda: defaultdict(list))
+    stages: Dict[str, Dict[str, List[float]]] = field(default_factory=lambda: defaultdict(lambda: defaultdict(list)))
+    statuses: Counter = field(default_factory=Counter)
+
+    def summary(self) -> dict:
+        requests = sum(len(values) for values in self.latencies.values())
+        return {
+            "concurrency": self.concurrency,
+            "requests": requests,
+            "throughput": requests / self.duration if self.duration else 0.0,
+            "statuses": {str(status): count for status, count in self.statuses.items()},
+            "endpoints": {
+                endpoint: {
+                    "count": len(values),
+                    "p50": percentile(values, 0.50),
+                    "p95": percentile(values, 0.95),
+                    "p99": percentile(values, 0.99),
+                    "stages": {
+                        stage: {"p50": percentile(spans, 0.50), "p95": percentile(spans, 0.95), "p99": percentile(spans, 0.99)}
+                        for stage, spans in self.stages[endpoint].items()
+                    }
+                }
+                for endpoint, values in self.latencies.items()
+            }
+        }
+
+
+def token(secret: str, user: str) -> str:
+    return jwt.encode({"userId": user, "exp": int(time.time()) + 3600}, secret, algorithm="HS256")
+
+
+async def worker(client: httpx.AsyncClient, result: Result, auth: str, rng: random.Random,
+                 ask_ratio: float, deadline: float):
+    while time.monotonic() < deadline:
+        if rng.random() < ask_ratio:
+            endpoint, body = "/ask", {"query": rng.choice(ASK_QUERIES)}
+        else:
+            endpoint, body = "/chat", {"query": rng.choice(CHAT_QUERIES), "personality": rng.choice(PERSONALITIES)}
+        start = time.perf_counter()
+        try:
+            response = await client.post(endpoint, json=body, headers={"Authorization": f"Bearer {auth}"})
+        except httpx.HTTPError as e:
+            result.statuses[type(e).__name__] += 1
+            continue
+        elapsed = time.perf_counter() - start
+        result.statuses[response.status_code] += 1
+        if response.status_code != 200:
+            continue
+        result.latencies[endpoint].append(elapsed)
+        for stage, seconds in parse_server_timing(response.headers.get("server-timing", "")).items():
+            result.stages[endpoint][stage].append(seconds)
+
+
+async def run(url: str, secret: str, concurrency: int, duration: float, ask_ratio: float,
+              users: int = None, seed: int = 0) -> Result:
+    """
+        Closed loop load: concurrency workers sending back to back requests for duration seconds,
+        each worker signs in as one of users distinct users
+    """
+    users = users or concurrency
+    result = Result(concurrency)
+    rng = random.Random(seed)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=300, limits=limits) as client:
+        deadline = time.monotonic() + duration
+        start = time.monotonic()
+        await asyncio.gather(*(
+            worker(client, result, token(secret, f"bench-{i % users}"), random.Random(rng.random()), ask_ratio, deadline)
+            for i in range(concurrency)
+        ))
+        result.duration = time.monotonic() - start
+    return result
+
+
+def report(summary: dict) -> str:
+    lines = [f"concurrency {summary['concurrency']}: {summary['requests']} requests, "
+             f"{summary['throughput']:.2f} req/s, statuses {summary['statuses']}"]
+    for endpoint, stats in summary["endpoints"].items():
+        lines.append(f"  {endpoint:<6} n={stats['count']:<5} p50={stats['p50'] * 1000:8.1f}ms "
+                     f"p95={stats['p95'] * 1000:8.1f}ms p99={stats['p99'] * 1000:8.1f}ms")
+        for stage, spans in sorted(stats["stages"].items()):
+            lines.append(f"    {stage:<10} p50={spans['p50'] * 1000:8.1f}ms "
+                         f"p95={spans['p95'] * 1000:8.1f}ms p99={spans['p99'] * 1000:8.1f}ms")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a mixed /ask and /chat workload against a running gateway")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--secret", default=os.getenv("JWT_SECRET_ACCESS"))
+    parser.add_argument("--concurrency", default="1,4,16", help="comma separated levels")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--ask-ratio", type=float, default=0.5)
+    parser.add_argument("--users", type=int, default=None, help="distinct users, defaults to one per worker")
+    args = parser.parse_args()
+
+    for level in [int(level) for level in args.concurrency.split(",")]:
+        result = asyncio.run(run(args.url, args.secret, level, args.duration, args.ask_ratio, args.users))
+        print(report(result.summary()))
@@ -0,0 +1,124 @@
+from benchmark import load
+from contextlib import contextmanager
+from typing import List
+import subprocess
+import argparse
+import asyncio
+import json
+import time
+import httpx
+import sys
+import os
+
+SECRET = "benchmark-secret"
+
+
+def start(args: List[str], env: dict = None) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, *args], env={**os.environ, **(env or {})})
+
+
+def wait_ready(url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+@contextmanager
+def services(args):
+    """
+        Stub Ollama, stub backend and the gateway pointed at them, stopped on exit
+    """
+    ollama = f"http://127.0.0.1:{args.ollama_port}"
+    backend = f"http://127.0.0.1:{args.backend_port}"
+    gateway = f"http://127.0.0.1:{args.port}"
+    processes = [
+        start(["-m", "benchmark.stubs", "ollama", "--port", str(args.ollama_port), "--latency", str(args.llm_latency),
+               "--tokens-per-second", str(args.tokens_per_second), "--tokens", str(args.tokens)]),
+        start(["-m", "benchmark.stubs", "backend", "--port", str(args.backend_port), "--latency", str(args.backend_latency),
+               "--expenses", str(args.expenses), "--payload", str(args.payload)]),
+    ]
+    try:
+        wait_ready(f"{ollama}/api/version")
+        wait_ready(f"{backend}/expense/get-expense")
+        env = {
+            "OLLAMA_HOST": ollama,
+            "OLLAMA_HOSTS": ollama,
+            "NODE_URL": backend,
+            "JWT_SECRET_ACCESS": SECRET,
+            # measure the pipeline, not the response caches
+            "LLM_CACHE_BACKEND": "memory" if args.cache else "off",
+            "BACKEND_CACHE_TTL": "30" if args.cache else "0",
+        }
+        processes.append(start(["-m", "uvicorn", "api_gateway.app:app", "--port", str(args.port), "--log-level", "warning"], env))
+        wait_ready(f"{gateway}/health")
+        yield gateway
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+def regressions(current: List[dict], baseline: List[dict], tolerance: float) -> List[str]:
+    """
+        p95 latencies and throughput that got worse than the baseline by more than tolerance
+    """
+    found = []
+    previous = {run["concurrency"]: run for run in baseline}
+    for run in current:
+        before = previous.get(run["concurrency"])
+        if before is None:
+            continue
+        if run["throughput"] < before["throughput"] * (1 - tolerance):
+            found.append(f"c={run['concurrency']} throughput {before['throughput']:.2f} -> {run['throughput']:.2f} req/s")
+        for endpoint, stats in run["endpoints"].items():
+            old = before["endpoints"].get(endpoint)
+            if old and stats["p95"] > old["p95"] * (1 + tolerance):
+                found.append(f"c={run['concurrency']} {endpoint} p95 {old['p95'] * 1000:.1f} -> {stats['p95'] * 1000:.1f}ms")
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline end to end benchmark of the gateway against stub services")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma separated levels")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per level")
+    parser.add_argument("--ask-ratio", type=float, default=0.5)
+    parser.add_argument("--users", type=int, default=None)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="stub Ollama seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--backend-latency", type=float, default=0.02)
+    parser.add_argument("--expenses", type=int, default=500)
+    parser.add_argument("--payload", type=int, default=60)
+    parser.add_argument("--cache", action="store_true", help="keep the response caches on")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--ollama-port", type=int, default=8601)
+    parser.add_argument("--backend-port", type=int, default=8602)
+    parser.add_argument("--output", help="write the results as json")
+    parser.add_argument("--baseline", help="json from an earlier --output to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = []
+    with services(args) as url:
+        for level in [int(level) for level in args.concurrency.split(",")]:
+            summary = asyncio.run(load.run(url, SECRET, level, args.duration, args.ask_ratio, args.users)).summary()
+            print(load.report(summary), flush=True)
+            results.append(summary)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print("REGRESSION", line)
+        sys.exit(1 if found else 0)
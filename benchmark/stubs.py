@@ -0,0 +1,194 @@
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from datetime import date, timedelta
+from common.vietnamese import CATEGORIES, TYPES, match_category, match_type, parse_amount
+import argparse
+import asyncio
+import random
+import json
+import time
+import uvicorn
+
+# rough size of a token, used to turn text lengths into token counts
+CHARS_PER_TOKEN = 4
+
+# keyword in the query -> tool the stub model picks and its arguments
+TOOL_KEYWORDS = [
+    ("lớn nhất", "function.get_max_expense", lambda query: {}),
+    ("nhỏ nhất", "function.get_min_expense", lambda query: {}),
+    ("tổng", "function.total_by_category", lambda query: {}),
+    ("theo tháng", "function.total_by_date", lambda query: {"bucket": "month"}),
+    ("đối tác", "function.top_partners", lambda query: {"limit": 3}),
+    ("hạng mục", "function.get_expense_by_category", lambda query: {"category": match_category(query) or "ăn uống"}),
+    ("tìm", "function.search_expenses", lambda query: {"keySearch": query.split()[-1]}),
+]
+
+WORDS = ["bạn", "đã", "chi", "tiêu", "cho", "ăn", "uống", "tháng", "này", "nhiều", "hơn", "nên", "tiết", "kiệm"]
+
+
+def words(count: int) -> str:
+    return " ".join(WORDS[i % len(WORDS)] for i in range(count))
+
+
+def pick_tool(query: str, tools: list) -> dict:
+    available = {tool["function"]["name"] for tool in tools}
+    for keyword, name, arguments in TOOL_KEYWORDS:
+        if keyword in query and name in available:
+            return {"name": name, "arguments": arguments(query)}
+    return {"name": "function.get_expenses", "arguments": {"page": 1, "pageSize": 5}}
+
+
+def ollama_app(latency: float, rate: float, tokens: int) -> FastAPI:
+    """
+        Answers like Ollama: latency before the first token, then rate tokens per second
+    """
+    app = FastAPI()
+
+    def classify(query: str) -> dict:
+        return {
+            "category": match_category(query) or CATEGORIES[-1],
+            "amount": parse_amount(query) or 0,
+            "type": match_type(query) or TYPES[0],
+            "partner": ""
+        }
+
+    def reply(body: dict) -> dict:
+        query = body["messages"][-1]["content"]
+        system = body["messages"][0]["content"]
+        if body.get("tools"):
+            return {"role": "assistant", "content": "", "tool_calls": [{"function": pick_tool(query, body["tools"])}]}
+        if body.get("format") and '"response"' in system:
+            return {"role": "assistant", "content": json.dumps({"response": words(tokens)}, ensure_ascii=False)}
+        if body.get("format") and '"items"' in system:
+            lines = [line.partition(". ") for line in query.splitlines()]
+            items = [{"id": int(number), **classify(text)} for number, _, text in lines]
+            return {"role": "assistant", "content": json.dumps({"items": items}, ensure_ascii=False)}
+        if body.get("format"):
+            content = {"description": query, **classify(query), "advice": words(tokens)}
+            return {"role": "assistant", "content": json.dumps(content, ensure_ascii=False)}
+        return {"role": "assistant", "content": words(tokens)}
+
+    def counts(body: dict, message: dict, elapsed: float) -> dict:
+        prompt = sum(len(str(m.get("content", ""))) for m in body["messages"]) + len(json.dumps(body.get("tools") or []))
+        output = max(1, len(message["content"]) // CHARS_PER_TOKEN)
+        return {
+            "model": body["model"],
+            "created_at": "2025-01-01T00:00:00Z",
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int(elapsed * 1e9),
+            "load_duration": 0,
+            "prompt_eval_count": prompt // CHARS_PER_TOKEN,
+            "prompt_eval_duration": int(latency * 1e9),
+            "eval_count": output,
+            "eval_duration": int(output / rate * 1e9)
+        }
+
+    @app.post("/api/chat")
+    async def chat(req: Request):
+        body = await req.json()
+        message = reply(body)
+        start = time.perf_counter()
+        output = max(1, len(message["content"]) // CHARS_PER_TOKEN)
+
+        if not body.get("stream", True):
+            await asyncio.sleep(latency + output / rate)
+            return {**counts(body, message, time.perf_counter() - start), "message": message}
+
+        async def stream():
+            await asyncio.sleep(latency)
+            content = message["content"]
+            for i in range(0, len(content), CHARS_PER_TOKEN):
+                await asyncio.sleep(1 / rate)
+                chunk = {"model": body["model"], "created_at": "2025-01-01T00:00:00Z", "done": False,
+                         "message": {"role": "assistant", "content": content[i:i + CHARS_PER_TOKEN]}}
+                yield json.dumps(chunk, ensure_ascii=False) + "\n"
+            last = {**message, "content": ""}
+            yield json.dumps({**counts(body, message, time.perf_counter() - start), "message": last}, ensure_ascii=False) + "\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    @app.post("/api/generate")
+    async def generate(req: Request):
+        body = await req.json()
+        return {"model": body["model"], "created_at": "2025-01-01T00:00:00Z", "done": True, "response": ""}
+
+    @app.get("/api/version")
+    async def version():
+        return {"version": "stub"}
+
+    return app
+
+
+def expenses(count: int, payload: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    today = date.today()
+    return [
+        {
+            "_id": f"e{i}",
+            "amount": rng.randrange(10, 2000) * 1000,
+            "category": rng.choice(CATEGORIES),
+            "type": rng.choice(TYPES),
+            "description": (f"giao dịch {i} " + "x" * payload)[:payload],
+            "partner": rng.choice(["Nam", "Lan", "Hùng", "Mai", ""]),
+            "createdAt": (today - timedelta(days=rng.randrange(365))).isoformat() + "T00:00:00Z"
+        }
+        for i in range(count)
+    ]
+
+
+def backend_app(latency: float, count: int, payload: int) -> FastAPI:
+    """
+        The expense endpoints the tools call, over a fixed generated history
+    """
+    app = FastAPI()
+    rows = expenses(count, payload)
+
+    @app.get("/expense/get-expense")
+    async def get_expense(page: int = 1, pageSize: int = 5, category: str = None, type: str = None):
+        await asyncio.sleep(latency)
+        selected = [row for row in rows if (category is None or row["category"] == category) and (type is None or row["type"] == type)]
+        return {"metadata": {"Expenses": selected[(page - 1) * pageSize:page * pageSize]}}
+
+    @app.get("/expense/getExpenseByAmount")
+    async def by_amount(amount: float, sinceBy: str = None):
+        await asyncio.sleep(latency)
+        return {"metadata": {"expense": [row for row in rows if row["amount"] == amount]}}
+
+    @app.get("/expense/sortExpenses")
+    async def sort_expenses(option: int = -1):
+        await asyncio.sleep(latency)
+        return {"metadata": {"expense": sorted(rows, key=lambda row: row["amount"] * option)[:10]}}
+
+    @app.get("/expense/sortPartner")
+    async def sort_partner(option: int = -1):
+        await asyncio.sleep(latency)
+        partners = {}
+        for row in rows:
+            if row["partner"]:
+                partners.setdefault(row["partner"], []).append(row)
+        ranked = sorted(partners.items(), key=lambda item: sum(row["amount"] for row in item[1]) * option)
+        return {"metadata": {"expense": [
+            {"_id": name, "amount": str(sum(row["amount"] for row in items)), "list": [row["_id"] for row in items]}
+            for name, items in ranked
+        ]}}
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub Ollama or expense backend for the benchmark")
+    parser.add_argument("kind", choices=["ollama", "backend"])
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the first token / per backend call")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--tokens", type=int, default=40, help="words in generated text")
+    parser.add_argument("--expenses", type=int, default=500, help="size of the expense history")
+    parser.add_argument("--payload", type=int, default=60, help="characters of each expense description")
+    args = parser.parse_args()
+
+    if args.kind == "ollama":
+        app = ollama_app(args.latency, args.tokens_per_second, args.tokens)
+    else:
+        app = backend_app(args.latency, args.expenses, args.payload)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
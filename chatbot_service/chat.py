@@ -1,5 +1,17 @@
-from ollama import chat, ChatResponse, AsyncClient, Client
-import json
+from ollama import ChatResponse
+from llm_service import llm_client, llm_cache, sessions, stages, structured, SchedulerRejected
+from common.context import current_user, user_id
+from common.vietnamese import CATEGORIES, TYPES, fold, normalize, parse_amount
+from common.log import get_logger
+from common.metrics import CHAT_PARSER
+from chatbot_service.parser import parse_transaction, CHAT_PARSER_ENABLED
+from dotenv import load_dotenv
+import asyncio
+import os
+
+load_dotenv()
+
+log = get_logger(__name__)
 
 prompt = {
     "humor": "You are a person who is positive, optimistic, and good for mental resilience. You make jokes and keep conversations lighthearted.",
@@ -27,47 +39,297 @@ prompt = {
     "bomman": "bạn là một youtuber nổi tiếng với những câu chửi đi vào lòng người như fuck your life, oh shit,... là một người thẳng thắn, nhìn thẳng vào vấn đề, có khả năng phóng đại sự thật để cho người khác nhận ra tầm quan trọng của việc bạn đang làm"
 }
 
+DEFAULT_PERSONALITY = "You are a helpful AI."
+
+# khi bộ phân tích luật đã điền đủ các trường, LLM chỉ còn viết lời khuyên
+CHAT_ADVICE = os.getenv("CHAT_ADVICE", "true").lower() in ("1", "true", "yes")
+CHAT_ADVICE_TOKENS = int(os.getenv("CHAT_ADVICE_TOKENS", 150))
+NO_ADVICE = "Không thể đưa ra lời khuyên."
+
+# tin nhắn tối đa trong một request /chat/batch
+CHAT_BATCH_MAX = int(os.getenv("CHAT_BATCH_MAX", 200))
+# số tin nhắn gộp vào một prompt
+CHAT_BATCH_PACK = int(os.getenv("CHAT_BATCH_PACK", 8))
+# số prompt chạy song song cho một batch, nhỏ hơn LLM_MAX_PER_USER để người dùng vẫn chat được
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", 3))
+
+BATCH_PROMPT = f"""Bạn là trợ lý phân loại giao dịch tài chính. Người dùng gửi nhiều tin nhắn, mỗi dòng một tin nhắn có số thứ tự.
+Với mỗi tin nhắn, trả về đúng một phần tử theo JSON sau, giữ nguyên thứ tự và không thêm trường nào khác:
+{{"items": [{{"id": số thứ tự, "category": hạng mục, "amount": số tiền, "type": loại, "partner": người giao dịch cùng}}]}}
+- category thuộc {CATEGORIES}, mặc định 'khác'.
+- amount là con số, ví dụ 50k = 50000, 1tr2 = 1200000, 1b = 1000000000.
+- type thuộc {TYPES}, mặc định 'gửi'.
+- partner để trống nếu không có."""
+
+# Ollama chỉ sinh đúng các trường này: hạng mục và loại theo danh sách, chuỗi có giới hạn độ dài.
+# description không cần mô hình chép lại, nó luôn là tin nhắn của người dùng
+CLASSIFY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "category": {"type": "string", "enum": CATEGORIES},
+        "amount": {"type": "number"},
+        "type": {"type": "string", "enum": TYPES},
+        "partner": {"type": "string", "maxLength": 60},
+        "advice": {"type": "string", "maxLength": 400}
+    },
+    "required": ["category", "amount", "type", "partner", "advice"],
+    "additionalProperties": False
+}
+
+BATCH_ITEM_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "id": {"type": "integer"},
+        "category": {"type": "string", "enum": CATEGORIES},
+        "amount": {"type": "number"},
+        "type": {"type": "string", "enum": TYPES},
+        "partner": {"type": "string", "maxLength": 60}
+    },
+    "required": ["id", "category", "amount", "type", "partner"],
+    "additionalProperties": False
+}
+
+
+def batch_schema(size: int):
+    return {
+        "type": "object",
+        "properties": {"items": {"type": "array", "items": BATCH_ITEM_SCHEMA, "maxItems": size}},
+        "required": ["items"],
+        "additionalProperties": False
+    }
+
+async def gather_or_cancel(coroutines) -> list:
+    """
+    Như asyncio.gather nhưng lỗi đầu tiên (ví dụ SchedulerRejected) hủy các tác vụ còn lại,
+    để chúng không tiếp tục xếp hàng gọi LLM khi client đã nhận 429/503.
+    """
+    tasks = [asyncio.create_task(coroutine) for coroutine in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
 class Model:
-    def __init__(self, personality: str):
+    def __init__(self, personality: str, prompts: dict = None):
         """
         Khởi tạo mô hình AI với tính cách cụ thể.
         """
-        self.personality = prompt.get(personality, "You are a helpful AI.")
-        self.client = Client(host="http://localhost:11434")
+        self.name = personality
+        self.personality = (prompt if prompts is None else prompts).get(personality, DEFAULT_PERSONALITY)
+        self.client = llm_client
+        self.cache = llm_cache
+        self.sessions = sessions
+        self.stage = stages.classify
+        self.advice_stage = stages.advice
+        # prompt hệ thống chỉ dựng một lần cho mỗi tính cách
+        self._system_prompt = self.build_system_prompt()
+        self._advice_prompt = self.build_advice_prompt()
 
-    def ask_model(self, query: str):
+    def system_prompt(self):
+        return self._system_prompt
+
+    def build_system_prompt(self):
         """
-        Xử lý input của người dùng, phân loại chi tiêu bằng AI và đưa ra lời khuyên.
+        Prompt hệ thống theo tính cách của mô hình.
         """
-        print("Processing AI response...")
-
-        # Prompt 
-        system_prompt = {
+        return {
             "role": "assistant",
             "content": f"""
                 Bạn là một trợ lý hữu ích trong quản lý tài chính, bạn chỉ có thể hiểu Tiếng Việt, nếu ai đó nói với bạn ngôn ngữ ngoài tiếng Việt 
                 thì bạn sẽ phản hồi là 'Tôi không hiểu, bạn hãy nói tiếng Việt'.
 
                 Nhiệm vụ của bạn là từ tin nhắn của người dùng, hãy phân loại những mục sau theo json format
-                1. description: Sao chép giống hệt tin nhắn của người dùng. Hãy nhớ là sao chép giống hệt
-                2. category: Phân loại chi tiêu của người dùng vào những hạng mục sau ['giải trí', 'mua sắm', 'di chuyển', 'sức khỏe', 'ăn uống', 'hóa đơn', 'nợ', 'khác']. Nếu không biết phân loại vào đâu thì mặc định phân loại 'Khác'.
-                3. amount: Số tiền mà người dùng đã thu hoặc đã chi. Đảm bảo rằng trả dưới dạng con số. Ví dụ 1000, 100000, 50000, 1b = 1000000000.
-                4. type: Xem là tin nhắn của người dùng thuộc loại chi hay nhận rồi phân loại vào mục sau ['gửi', 'nhận']. Đảm bảo phân loại đúng, nếu không biết phân vào đâu thì mặc định là 'Gửi'
-                5. partner: Là người giao dịch cùng
-                6. advice: Là lời khuyên dựa vào cách chi tiêu của người dùng.
+                1. category: Phân loại chi tiêu của người dùng vào những hạng mục sau ['giải trí', 'mua sắm', 'di chuyển', 'sức khỏe', 'ăn uống', 'hóa đơn', 'nợ', 'khác']. Nếu không biết phân loại vào đâu thì mặc định phân loại 'khác'.
+                2. amount: Số tiền mà người dùng đã thu hoặc đã chi. Đảm bảo rằng trả dưới dạng con số. Ví dụ 1000, 100000, 50000, 1b = 1000000000.
+                3. type: Xem là tin nhắn của người dùng thuộc loại chi hay nhận rồi phân loại vào mục sau ['gửi', 'nhận']. Đảm bảo phân loại đúng, nếu không biết phân vào đâu thì mặc định là 'gửi'
+                4. partner: Là người giao dịch cùng, để trống nếu không có
+                5. advice: Là lời khuyên ngắn gọn (dưới 60 từ) dựa vào cách chi tiêu của người dùng.
 
                 Hãy đảm bảo bạn trả ra phản hồi bằng tiếng Việt và nói 'Tôi không hiểu, bạn hãy nói tiếng Việt' nếu có ai đó không dùng tiếng Việt.
                 Ngoài ra bạn hãy giả vờ là có tính cách như sau: {self.personality}. Hãy phản hồi dựa theo tính cách của bạn
             """
         }
 
-        response = self.client.chat(
-            model="qwen2.5:7b",
-            messages=[system_prompt, {"role": "user", "content": query}],
-            format="json"
-        )
+    def build_advice_prompt(self):
+        """
+        Prompt chỉ để viết lời khuyên, các trường còn lại đã được bộ phân tích luật điền sẵn.
+        """
+        return {
+            "role": "system",
+            "content": f"""Bạn là một trợ lý hữu ích trong quản lý tài chính và chỉ nói tiếng Việt.
+Người dùng vừa ghi lại một giao dịch, các thông tin đã được phân loại sẵn ở cuối tin nhắn.
+Hãy đưa ra một lời khuyên ngắn gọn (dưới 60 từ) dựa vào cách chi tiêu này. Chỉ trả về lời khuyên, không lặp lại thông tin giao dịch.
+Hãy giả vờ là có tính cách như sau: {self.personality}. Hãy phản hồi dựa theo tính cách của bạn"""
+        }
+
+    def from_cache(self, cached: str, query: str):
+        """
+        Kết quả trong cache có thể đến từ tin nhắn khác cách viết hoa/khoảng trắng, description phải giống hệt tin nhắn hiện tại.
+        """
+        json_response = structured.loads(cached)
+        if "description" in json_response:
+            json_response["description"] = query
+        return json_response
+
+    def session(self):
+        """
+        Lịch sử trò chuyện của người dùng hiện tại với tính cách này, None nếu không có người dùng.
+        """
+        return self.sessions.get(user_id(current_user.get()), "chat", self.name)
+
+    def warmup_prompt(self):
+        """
+        Prompt dùng để làm nóng prompt cache của Ollama khi khởi động, cùng tiền tố với request thật.
+        """
+        return self.stage.models[0], [self.system_prompt(), {"role": "user", "content": "xin chào"}], {"format": structured.output_format(CLASSIFY_SCHEMA)}
+
+    def advice_warmup_prompt(self):
+        fields = parse_transaction("ăn phở 50k").fields()
+        return self.advice_stage.models[0], self.advice_messages(None, fields), {"options": {"num_predict": CHAT_ADVICE_TOKENS}}
+
+    def messages(self, session, query: str):
+        # prompt hệ thống, tóm tắt và các lượt cũ giữ nguyên thứ tự để Ollama dùng lại prompt cache
+        return [self.system_prompt(), *self.sessions.history(session), {"role": "user", "content": query}]
+
+    def cache_key(self, query: str):
+        return self.cache.key(",".join(self.stage.models), self.system_prompt()["content"], query)
+
+    def advice_cache_key(self, query: str):
+        return self.cache.key("advice:" + ",".join(self.advice_stage.models), self._advice_prompt["content"], query)
+
+    def advice_messages(self, session, fields: dict):
+        transaction = structured.dumps({key: value for key, value in fields.items() if key != "description"})
+        return [
+            self._advice_prompt,
+            *self.sessions.history(session),
+            {"role": "user", "content": f"{fields['description']}\n\nGiao dịch: {transaction}"}
+        ]
+
+    @staticmethod
+    def quick_parse(query: str):
+        """
+        Kết quả của bộ phân tích luật nếu mọi trường đủ tin cậy, None nếu cần hỏi LLM.
+        """
+        if not CHAT_PARSER_ENABLED:
+            return None
+        parsed = parse_transaction(query)
+        CHAT_PARSER.labels("hit" if parsed.confident else "miss").inc()
+        if not parsed.confident:
+            log.debug("parser not confident %r %s", query, parsed.confidence)
+            return None
+        return parsed
+
+    async def advise(self, session, fields: dict) -> str:
+        """
+        Lời khuyên cho giao dịch đã phân loại. Lỗi hay quá tải chỉ làm mất lời khuyên, các trường vẫn được trả về.
+        """
+        if not CHAT_ADVICE:
+            return ""
+        try:
+            return await self.advice_stage.run(
+                parse=lambda response: response.message.content.strip(),
+                confident=bool,
+                messages=self.advice_messages(session, fields),
+                options={"num_predict": CHAT_ADVICE_TOKENS}
+            )
+        except Exception as e:
+            log.warning("advice failed: %r", e)
+            return None
+
+    async def ask_parsed(self, query: str, session, fields: dict):
+        """
+        Các trường đến từ bộ phân tích luật, LLM chỉ sinh lời khuyên.
+        """
+        first_turn = session is None or session.empty
+        cache_key = self.advice_cache_key(query)
+        cached = await self.cache.get(cache_key) if first_turn and CHAT_ADVICE else None
+        if cached is not None:
+            self.sessions.append(session, query, cached)
+            return self.from_cache(cached, query)
+
+        advice = await self.advise(session, fields)
+        json_response = {**fields, "advice": NO_ADVICE if advice is None else advice}
+        content = structured.dumps(json_response)
+
+        self.sessions.append(session, query, content)
+        if first_turn and advice:
+            await self.cache.set(cache_key, content)
+        return json_response
+
+    @staticmethod
+    def parse(query: str, content: str):
+        """
+        Câu trả lời của mô hình theo CLASSIFY_SCHEMA, đã sửa lỗi JSON nhỏ và cắt trường thừa, kèm bản JSON gọn để lưu.
+        """
+        json_response = {"description": query, **structured.parse(content, CLASSIFY_SCHEMA)}
+        return structured.dumps(json_response), json_response
+
+    @staticmethod
+    def fallback(query: str):
+        """
+        Mô hình lớn nhất vẫn trả lời sai: dùng kết quả của bộ phân tích luật dù chưa chắc chắn thay vì báo lỗi.
+        """
+        json_response = {**parse_transaction(query).fields(), "advice": NO_ADVICE}
+        return structured.dumps(json_response), json_response
+
+    @staticmethod
+    def confident(query: str, result) -> bool:
+        """
+        Câu trả lời của mô hình nhỏ đúng schema và khớp số tiền đọc được trực tiếp từ tin nhắn, nếu không thì hỏi mô hình lớn hơn.
+        """
+        _, data = result
+        if not isinstance(data, dict):
+            return False
+        if fold(str(data.get("category", ""))) not in map(fold, CATEGORIES):
+            return False
+        if fold(str(data.get("type", ""))) not in map(fold, TYPES):
+            return False
+        try:
+            amount = float(data.get("amount"))
+        except (TypeError, ValueError):
+            return False
+        expected = parse_amount(query)
+        return expected is None or abs(amount - expected) < 1
+
+    async def ask_model(self, query: str):
+        """
+        Xử lý input của người dùng, phân loại chi tiêu bằng AI và đưa ra lời khuyên.
+        """
+        log.debug("classify %r", query)
+
+        session = self.session()
+
+        parsed = self.quick_parse(query)
+        if parsed is not None:
+            return await self.ask_parsed(query, session, parsed.fields())
+
+        # kết quả phân loại chỉ phụ thuộc vào tin nhắn nên tin nhắn lặp lại được lấy từ cache,
+        # miễn là chưa có lượt trò chuyện trước mà câu trả lời có thể phụ thuộc vào
+        first_turn = session is None or session.empty
+        cache_key = self.cache_key(query)
+        cached = await self.cache.get(cache_key) if first_turn else None
+        if cached is not None:
+            self.sessions.append(session, query, cached)
+            return self.from_cache(cached, query)
+
+        try:
+            content, json_response = await self.stage.run(
+                parse=lambda response: self.parse(query, response.message.content),
+                confident=lambda result: self.confident(query, result),
+                messages=self.messages(session, query),
+                schema=CLASSIFY_SCHEMA
+            )
+        except ValueError as e:
+            log.warning("classify failed, using the parser: %r", e)
+            content, json_response = self.fallback(query)
+            first_turn = False
 
-        json_response = json.loads(response.message.content)
+        self.sessions.append(session, query, content)
+        if first_turn:
+            await self.cache.set(cache_key, content)
 
 
         # result = {
@@ -77,5 +339,228 @@ class Model:
         #     "advice": ai_data.get("advice", "Không thể đưa ra lời khuyên.")
         # }
 
-        print("AI response completed!")
+        log.debug("classify done %r", query)
         return json_response
+
+    async def ask_model_stream(self, query: str):
+        """
+        Giống ask_model nhưng trả về từng đoạn (event, data): "delta" khi mô hình sinh thêm, "done" với kết quả json.
+        Nếu mô hình nhỏ trả lời sai, "done" mang kết quả của mô hình lớn hơn.
+        Khi bộ phân tích luật đủ tin cậy: "fields" với các trường ngay lập tức, "advice" khi lời khuyên được sinh thêm, rồi "done".
+        """
+        log.debug("classify stream %r", query)
+        session = self.session()
+
+        parsed = self.quick_parse(query)
+        if parsed is not None:
+            async for event in self.ask_parsed_stream(query, session, parsed.fields()):
+                yield event
+            return
+
+        first_turn = session is None or session.empty
+        cache_key = self.cache_key(query)
+        cached = await self.cache.get(cache_key) if first_turn else None
+        if cached is not None:
+            self.sessions.append(session, query, cached)
+            yield "delta", cached
+            yield "done", self.from_cache(cached, query)
+            return
+
+        content = ""
+        async for chunk in self.stage.stream(
+            messages=self.messages(session, query),
+            schema=CLASSIFY_SCHEMA
+        ):
+            if chunk.message.content:
+                content += chunk.message.content
+                yield "delta", chunk.message.content
+
+        try:
+            result = self.parse(query, content)
+            escalate = len(self.stage.models) > 1 and not self.confident(query, result)
+        except ValueError:
+            result, escalate = None, True
+        try:
+            if escalate:
+                models = self.stage.models[1:] or self.stage.models
+                # qua cùng hàm với Stage.cascade để /metrics đếm cả lần chuyển mô hình của luồng
+                self.stage.escalate(self.stage.models[0], models[0], "streamed answer rejected")
+                result = await self.stage.run(
+                    parse=lambda response: self.parse(query, response.message.content),
+                    confident=lambda result: self.confident(query, result),
+                    models=models,
+                    messages=self.messages(session, query),
+                    schema=CLASSIFY_SCHEMA
+                )
+        except ValueError as e:
+            log.warning("classify failed, using the parser: %r", e)
+            result = self.fallback(query)
+            first_turn = False
+        content, json_response = result
+
+        self.sessions.append(session, query, content)
+        if first_turn:
+            await self.cache.set(cache_key, content)
+        log.debug("classify stream done %r", query)
+        yield "done", json_response
+
+
+    async def ask_parsed_stream(self, query: str, session, fields: dict):
+        yield "fields", fields
+
+        first_turn = session is None or session.empty
+        cache_key = self.advice_cache_key(query)
+        cached = await self.cache.get(cache_key) if first_turn and CHAT_ADVICE else None
+        if cached is not None:
+            self.sessions.append(session, query, cached)
+            yield "done", self.from_cache(cached, query)
+            return
+
+        advice = ""
+        if CHAT_ADVICE:
+            try:
+                async for chunk in self.advice_stage.stream(
+                    messages=self.advice_messages(session, fields),
+                    options={"num_predict": CHAT_ADVICE_TOKENS}
+                ):
+                    if chunk.message.content:
+                        advice += chunk.message.content
+                        yield "advice", chunk.message.content
+            except Exception as e:
+                log.warning("advice stream failed: %r", e)
+                advice = None
+
+        json_response = {**fields, "advice": NO_ADVICE if advice is None else advice.strip()}
+        content = structured.dumps(json_response)
+        self.sessions.append(session, query, content)
+        if first_turn and advice:
+            await self.cache.set(cache_key, content)
+        yield "done", json_response
+
+    def batch_messages(self, queries: list):
+        lines = "\n".join(f"{i + 1}. {query}" for i, query in enumerate(queries))
+        return [{"role": "system", "content": BATCH_PROMPT}, {"role": "user", "content": lines}]
+
+    def parse_batch(self, queries: list, content: str) -> dict:
+        """
+        Kết quả hợp lệ theo vị trí trong gói, phần tử thiếu hoặc sai schema bị bỏ qua.
+        """
+        data = structured.loads(content)
+        items = data.get("items", []) if isinstance(data, dict) else []
+        results = {}
+        for item in items if isinstance(items, list) else []:
+            try:
+                item = structured.conform(item, BATCH_ITEM_SCHEMA)
+            except ValueError:
+                continue
+            i = item.pop("id") - 1
+            if 0 <= i < len(queries) and self.confident(queries[i], (None, item)):
+                results[i] = {"description": queries[i], **item}
+        return results
+
+    async def classify_pack(self, queries: list, semaphore: asyncio.Semaphore) -> dict:
+        async with semaphore:
+            try:
+                return await self.stage.run(
+                    parse=lambda response: self.parse_batch(queries, response.message.content),
+                    confident=lambda results: len(results) == len(queries),
+                    messages=self.batch_messages(queries),
+                    schema=batch_schema(len(queries))
+                )
+            except SchedulerRejected:
+                raise
+            except Exception as e:
+                log.warning("batch of %d failed: %r", len(queries), e)
+                return {}
+
+    async def ask_batch(self, queries: list) -> list:
+        """
+        Phân loại nhiều tin nhắn một lần: bỏ trùng, dùng bộ phân tích luật và cache, phần còn lại gộp CHAT_BATCH_PACK tin nhắn vào một prompt
+        và chạy tối đa CHAT_BATCH_CONCURRENCY prompt song song. Kết quả theo đúng thứ tự đầu vào.
+        Không có lời khuyên và không ghi vào lịch sử trò chuyện.
+        """
+        # bộ phân tích luật và prompt cần tin nhắn gốc (chữ hoa của tên người), mỗi khóa chuẩn hóa lấy tin nhắn đầu tiên.
+        # Khóa chuẩn hóa chỉ dùng để bỏ trùng và làm khóa cache
+        originals = {}
+        for query in queries:
+            originals.setdefault(normalize(query), query)
+        unique = list(originals)
+        keys = {text: self.cache.key("batch:" + ",".join(self.stage.models), BATCH_PROMPT, text) for text in unique}
+
+        found = {}
+        for text in unique:
+            parsed = self.quick_parse(originals[text])
+            if parsed is not None:
+                found[text] = parsed.fields()
+                continue
+            cached = await self.cache.get(keys[text])
+            if cached is not None:
+                found[text] = structured.loads(cached)
+        missing = [text for text in unique if text not in found]
+
+        semaphore = asyncio.Semaphore(CHAT_BATCH_CONCURRENCY)
+        packs = [missing[i:i + CHAT_BATCH_PACK] for i in range(0, len(missing), CHAT_BATCH_PACK)]
+        answers = await gather_or_cancel(self.classify_pack([originals[text] for text in pack], semaphore) for pack in packs)
+        for pack, results in zip(packs, answers):
+            for i, result in results.items():
+                found[pack[i]] = result
+
+        # tin nhắn mô hình bỏ sót trong gói được hỏi lại riêng
+        leftovers = [text for text in missing if text not in found]
+        answers = await gather_or_cancel(self.classify_pack([originals[text]], semaphore) for text in leftovers)
+        for text, results in zip(leftovers, answers):
+            if 0 in results:
+                found[text] = results[0]
+
+        for text in missing:
+            if text in found:
+                await self.cache.set(keys[text], structured.dumps(found[text]))
+
+        output = []
+        for query in queries:
+            result = found.get(normalize(query))
+            if result is None:
+                output.append({"description": query, "error": "Không thể phân loại tin nhắn này"})
+            else:
+                output.append({**result, "description": query})
+        return output
+
+
+class ModelRegistry:
+    def __init__(self, prompts: dict = prompt):
+        """
+        Giữ một Model cho mỗi tính cách, dựng sẵn khi khởi động thay vì tạo mới ở mỗi request.
+        """
+        self.prompts = prompts
+        self.models = {}
+        self.reload()
+
+    def reload(self, prompts: dict = None):
+        """
+        Dựng lại toàn bộ Model, gọi sau khi thay dict prompt.
+        """
+        if prompts is not None:
+            self.prompts = prompts
+        self.models = {name: Model(name, self.prompts) for name in self.prompts}
+        self.models[None] = Model(None, self.prompts)
+
+    def warmup_prompts(self):
+        # thứ tự cố định, không theo số lần dùng: có parser thì tin nhắn đủ tin cậy chỉ cần lời khuyên nên prompt lời khuyên
+        # đứng trước, các tính cách theo thứ tự trong dict prompt
+        prompts = [model.warmup_prompt() for model in self.models.values()]
+        if CHAT_PARSER_ENABLED and CHAT_ADVICE:
+            prompts = [model.advice_warmup_prompt() for model in self.models.values()] + prompts
+        return prompts
+
+    def get(self, personality: str) -> Model:
+        # tính cách lạ dùng chung Model mặc định để registry không phình theo input
+        name = personality if personality in self.prompts else None
+        model = self.models.get(name)
+        # dict prompt bị sửa trực tiếp thì dựng lại Model đó
+        if model is None or model.personality != self.prompts.get(name, DEFAULT_PERSONALITY):
+            model = Model(name, self.prompts)
+            self.models[name] = model
+        return model
+
+
+models = ModelRegistry()
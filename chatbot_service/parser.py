@@ -0,0 +1,135 @@
+from dataclasses import dataclass, field
+from dotenv import load_dotenv
+from typing import Dict, Optional
+from common.vietnamese import CATEGORIES, TYPES, category_hits, parse_amounts, type_hits
+import re
+import os
+
+load_dotenv()
+
+# độ tin cậy tối thiểu của mọi trường để trả lời không cần LLM phân loại
+CHAT_PARSER_THRESHOLD = float(os.getenv("CHAT_PARSER_THRESHOLD", 0.75))
+CHAT_PARSER_ENABLED = os.getenv("CHAT_PARSER_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# "cho"/"từ" đứng trước người giao dịch cùng: "chuyển cho Nam", "nhận tiền từ mẹ"
+PARTNER_PATTERN = re.compile(r"(?<!\w)(cho(?:\s+vay|\s+mượn)?|từ)\s+", re.IGNORECASE)
+WORD_PATTERN = re.compile(r"[^\W\d_]+")
+# xưng hô và người thân, coi là một phần tên người giao dịch
+RELATIONS = {
+    'anh', 'chị', 'em', 'bạn', 'mẹ', 'bố', 'ba', 'má', 'cô', 'chú', 'dì', 'cậu', 'mợ', 'ông', 'bà',
+    'vợ', 'chồng', 'con', 'sếp', 'thầy', 'cháu', 'bác', 'cha',
+}
+# từ sau "cho"/"từ" không phải tên người: "cho vay", "từ hôm qua", "tiền cho ăn"
+STOP_WORDS = {
+    'vay', 'mượn', 'tiền', 'ăn', 'uống', 'mua', 'đi', 'để', 'vào', 'lúc', 'hôm', 'ngày', 'tháng', 'tuần', 'năm',
+    'với', 'về', 'qua', 'nay', 'số', 'khoản', 'nhé', 'nha', 'ạ', 'và', 'là', 'được', 'mình', 'tôi', 'tao', 'tớ',
+    'cái', 'chiếc', 'một', 'hai', 'ba', 'các', 'những', 'lương', 'thưởng', 'sáng', 'trưa', 'chiều', 'tối',
+}
+MAX_PARTNER_WORDS = 3
+
+
+@dataclass
+class Transaction:
+    description: str
+    category: str = CATEGORIES[-1]
+    amount: float = 0
+    type: str = TYPES[0]
+    partner: str = ""
+    confidence: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def score(self) -> float:
+        return min(self.confidence.values(), default=0.0)
+
+    @property
+    def confident(self) -> bool:
+        return self.score >= CHAT_PARSER_THRESHOLD
+
+    def fields(self) -> dict:
+        return {
+            "description": self.description,
+            "category": self.category,
+            "amount": self.amount,
+            "type": self.type,
+            "partner": self.partner
+        }
+
+
+def parse_partner(query: str) -> Optional[str]:
+    """
+    Tên sau "cho"/"từ" trong tin nhắn gốc, giữ nguyên cách viết: "chuyển cho anh Nam 500k" -> "anh Nam".
+    """
+    for marker in PARTNER_PATTERN.finditer(query):
+        words = []
+        for match in WORD_PATTERN.finditer(query, marker.end()):
+            gap = query[marker.end() if not words else words[-1].end():match.start()]
+            # dừng ở số tiền, dấu câu hoặc từ thường gặp không phải tên
+            if gap.strip() or match.group().lower() in STOP_WORDS and match.group().lower() not in RELATIONS:
+                break
+            words.append(match)
+            if len(words) == MAX_PARTNER_WORDS:
+                break
+        if words:
+            return query[words[0].start():words[-1].end()]
+    return None
+
+
+def partner_confidence(partner: str) -> float:
+    # "mẹ", "anh Nam", "Lan" là tên người, "cho shop quần" thì chưa chắc
+    first = partner.split()[0]
+    return 0.9 if first.lower() in RELATIONS or first[:1].isupper() else 0.6
+
+
+def unmarked_partner(query: str) -> bool:
+    # "trả anh Hùng 300k", "chuyển Nam 200k", "gửi mẹ 1tr": có người giao dịch nhưng thiếu "cho"/"từ" để tách tên
+    words = WORD_PATTERN.findall(query)
+    return any(word.lower() in RELATIONS for word in words) or any(word[:1].isupper() for word in words[1:])
+
+
+def parse_transaction(query: str) -> Transaction:
+    """
+    Điền các trường của /chat bằng luật, mỗi trường kèm độ tin cậy từ 0 đến 1.
+    Trường nào mơ hồ (không có hoặc có nhiều số tiền, từ khóa của nhiều hạng mục/loại) có độ tin cậy thấp.
+    """
+    result = Transaction(description=query)
+    confidence = result.confidence
+
+    amounts = list(parse_amounts(query))
+    if amounts:
+        result.amount, has_unit = amounts[0]
+        if len({amount for amount, _ in amounts}) > 1:
+            confidence["amount"] = 0.4
+        else:
+            confidence["amount"] = 0.95 if has_unit else 0.8
+    else:
+        confidence["amount"] = 0.0
+
+    partner = parse_partner(query)
+    if partner:
+        result.partner = partner
+        confidence["partner"] = partner_confidence(partner)
+    else:
+        confidence["partner"] = 0.5 if unmarked_partner(query) else 0.9
+
+    categories = list(dict.fromkeys(category_hits(query)))
+    types = list(dict.fromkeys(type_hits(query)))
+
+    if types:
+        result.type = types[0]
+        confidence["type"] = 0.9 if len(types) == 1 else 0.5
+    elif categories and categories[0] not in ('nợ', CATEGORIES[-1]):
+        # "ăn phở 50k" không có động từ nhưng hạng mục chi tiêu đã cho biết là 'gửi'
+        confidence["type"] = 0.85
+    else:
+        confidence["type"] = 0.6
+
+    if categories:
+        result.category = categories[0]
+        confidence["category"] = 0.9 if len(categories) == 1 else 0.5
+    elif partner or result.type == 'nhận' and types:
+        # chuyển tiền cho người khác hay khoản thu không có từ khóa hạng mục thường là 'khác'
+        confidence["category"] = 0.8
+    else:
+        confidence["category"] = 0.5
+
+    return result
@@ -0,0 +1,19 @@
+from contextvars import ContextVar
+from typing import Optional
+
+# decoded JWT of the request being served, set by the auth middleware
+current_user: ContextVar[Optional[dict]] = ContextVar("current_user", default=None)
+
+# claims the backend may use for the user id in the access token
+USER_ID_CLAIMS = ["userId", "user_id", "_id", "id", "sub"]
+
+def user_id(user: Optional[dict]) -> Optional[str]:
+    """
+        Id of the user decoded from the JWT (req.state.user)
+    """
+    if not user:
+        return None
+    for claim in USER_ID_CLAIMS:
+        if user.get(claim) is not None:
+            return str(user[claim])
+    return None
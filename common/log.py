@@ -0,0 +1,38 @@
+from logging.handlers import QueueHandler, QueueListener
+from dotenv import load_dotenv
+import logging
+import queue
+import sys
+import os
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+_queue = queue.SimpleQueue()
+_handler = logging.StreamHandler(sys.stdout)
+_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+# records are formatted on the event loop but written by this thread, so slow stdout never blocks a request
+listener = QueueListener(_queue, _handler, respect_handler_level=True)
+
+root = logging.getLogger("walletbot")
+root.setLevel(LOG_LEVEL)
+root.addHandler(QueueHandler(_queue))
+root.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    return root.getChild(name)
+
+
+def start():
+    if listener._thread is None:
+        listener.start()
+
+
+def stop():
+    if listener._thread is not None:
+        listener.stop()
+
+
+start()
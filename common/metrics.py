@@ -0,0 +1,47 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# seconds, from a cached lookup up to a slow generation on CPU
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+REQUEST_SECONDS = Histogram("walletbot_request_seconds", "Whole request time by route and status", ["method", "route", "status"], buckets=BUCKETS)
+SPAN_SECONDS = Histogram("walletbot_span_seconds", "Time spent in each stage of a request", ["span"], buckets=BUCKETS)
+
+OLLAMA_SECONDS = Histogram("walletbot_ollama_seconds", "Ollama time per phase as reported by Ollama", ["model", "phase"], buckets=BUCKETS)
+OLLAMA_TOKENS = Counter("walletbot_ollama_tokens_total", "Tokens evaluated by Ollama, kind is prompt or eval", ["model", "kind"])
+OLLAMA_ERRORS = Counter("walletbot_ollama_errors_total", "Failed Ollama calls per node", ["host"])
+ESCALATIONS = Counter("walletbot_stage_escalations_total", "Answers handed to the next model of a stage", ["stage", "model"])
+
+SCHEDULER_REJECTED = Counter("walletbot_scheduler_rejected_total", "Generations refused by the scheduler", ["reason"])
+SCHEDULER_RUNNING = Gauge("walletbot_scheduler_running", "Generations in flight")
+SCHEDULER_QUEUED = Gauge("walletbot_scheduler_queued", "Generations waiting for a slot")
+
+TOOL_SECONDS = Histogram("walletbot_tool_seconds", "Tool execution time", ["tool", "outcome"], buckets=BUCKETS)
+BACKEND_SECONDS = Histogram("walletbot_backend_seconds", "Expense backend call time", ["path", "status"], buckets=BUCKETS)
+CHAT_PARSER = Counter("walletbot_chat_parser_total", "Chat messages classified by the rule based parser (hit) or the LLM (miss)", ["outcome"])
+
+# ChatResponse fields, the durations are in nanoseconds
+OLLAMA_PHASES = {"load": "load_duration", "prompt_eval": "prompt_eval_duration", "eval": "eval_duration", "total": "total_duration"}
+
+
+def ollama_counts(response) -> dict:
+    """
+        Token counts and durations of a finished Ollama response, empty for a partial stream chunk
+    """
+    if not getattr(response, "done", False):
+        return {}
+    counts = {
+        "prompt_eval_count": getattr(response, "prompt_eval_count", None) or 0,
+        "eval_count": getattr(response, "eval_count", None) or 0,
+    }
+    for phase, field in OLLAMA_PHASES.items():
+        counts[field] = getattr(response, field, None) or 0
+    return counts
+
+
+def observe_ollama(model: str, counts: dict):
+    if not counts:
+        return
+    OLLAMA_TOKENS.labels(model, "prompt").inc(counts["prompt_eval_count"])
+    OLLAMA_TOKENS.labels(model, "eval").inc(counts["eval_count"])
+    for phase, field in OLLAMA_PHASES.items():
+        OLLAMA_SECONDS.labels(model, phase).observe(counts[field] / 1e9)
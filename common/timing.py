@@ -0,0 +1,51 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+from common.metrics import SPAN_SECONDS
+import time
+
+# spans kept per request for the trace log, aggregations can make hundreds of backend calls
+MAX_SPANS = 200
+
+
+class Trace:
+    def __init__(self):
+        """
+            Spans of one request: total seconds per name for Server-Timing and the individual spans for the trace log
+        """
+        self.start = time.perf_counter()
+        self.timings = {}
+        self.spans = []
+
+    def add(self, name: str, start: float, elapsed: float, attributes: dict):
+        self.timings[name] = self.timings.get(name, 0.0) + elapsed
+        if len(self.spans) < MAX_SPANS:
+            self.spans.append({"name": name, "at_ms": round((start - self.start) * 1000, 1), "ms": round(elapsed * 1000, 1), **attributes})
+
+
+# trace of the request being served, set by the timing middleware
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+        Time the block into the span_seconds histogram and the current request's trace,
+        the block can add attributes to the yielded dict, blocks running concurrently under the same name add up
+    """
+    start = time.perf_counter()
+    try:
+        yield attributes
+    except BaseException as e:
+        attributes["error"] = type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        SPAN_SECONDS.labels(name).observe(elapsed)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.add(name, start, elapsed, attributes)
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
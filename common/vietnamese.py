@@ -0,0 +1,200 @@
+from datetime import date, timedelta
+from typing import Iterator, List, Optional, Tuple
+import unicodedata
+import re
+
+CATEGORIES = ['giải trí', 'mua sắm', 'di chuyển', 'sức khỏe', 'ăn uống', 'hóa đơn', 'nợ', 'khác']
+TYPES = ['gửi', 'nhận']
+
+CATEGORY_KEYWORDS = {
+    'ăn uống': ['ăn uống', 'uống nước', 'ăn', 'uống', 'phở', 'bún', 'cơm', 'bánh mì', 'cà phê', 'cafe', 'cf', 'trà sữa', 'nhà hàng', 'đồ ăn', 'nhậu', 'bia', 'lẩu', 'nướng', 'ăn sáng', 'ăn trưa', 'ăn tối'],
+    'di chuyển': ['di chuyển', 'grab', 'be', 'xanh sm', 'taxi', 'xăng', 'xe buýt', 'xe bus', 'vé xe', 'vé tàu', 'vé máy bay', 'gửi xe', 'đổ xăng', 'sửa xe'],
+    'mua sắm': ['mua sắm', 'shopee', 'lazada', 'tiki', 'quần áo', 'áo', 'quần', 'giày', 'dép', 'túi', 'mỹ phẩm', 'điện thoại', 'laptop', 'siêu thị'],
+    'giải trí': ['giải trí', 'phim', 'rạp', 'game', 'karaoke', 'du lịch', 'netflix', 'spotify', 'youtube premium', 'concert', 'vé xem'],
+    'sức khỏe': ['sức khỏe', 'sức khoẻ', 'thuốc', 'bệnh viện', 'khám', 'nha khoa', 'gym', 'bảo hiểm y tế', 'vitamin'],
+    'hóa đơn': ['hóa đơn', 'hoá đơn', 'tiền điện', 'tiền nước', 'điện', 'nước', 'internet', 'wifi', 'mạng', 'tiền nhà', 'thuê nhà', 'học phí', 'nạp điện thoại', 'cước'],
+    'nợ': ['nợ', 'vay', 'trả nợ', 'cho vay', 'mượn', 'trả góp'],
+}
+
+TYPE_KEYWORDS = {
+    'nhận': ['nhận', 'thu', 'được cho', 'được tặng', 'lương', 'thưởng', 'hoàn tiền', 'từ'],
+    'gửi': ['gửi', 'chi', 'chuyển', 'trả', 'mua', 'tiêu', 'thanh toán', 'đóng', 'nạp', 'cho', 'tặng'],
+}
+
+UNITS = {
+    'k': 1e3, 'nghìn': 1e3, 'ngàn': 1e3, 'nghin': 1e3, 'ngan': 1e3,
+    'tr': 1e6, 'triệu': 1e6, 'trieu': 1e6, 'củ': 1e6, 'cu': 1e6, 'm': 1e6,
+    'b': 1e9, 'tỷ': 1e9, 'tỉ': 1e9, 'ty': 1e9, 'ti': 1e9,
+    'đ': 1, 'd': 1, 'đồng': 1, 'dong': 1, 'vnd': 1, 'vnđ': 1,
+}
+
+AMOUNT_PATTERN = re.compile(
+    r"(?<![\w/.,-])(\d+(?:[.,]\d+)*)\s*(" + "|".join(sorted(map(re.escape, UNITS), key=len, reverse=True)) + r")?(\d{1,3})?(?![\w/])",
+    re.IGNORECASE
+)
+ISO_DATE_PATTERN = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+VN_DATE_PATTERN = re.compile(r"\b(\d{1,2})/(\d{1,2})(?:/(\d{4}))?\b")
+MONTH_PATTERN = re.compile(r"\btháng (\d{1,2})(?:(?: năm |/)(\d{4}))?\b")
+
+def normalize(text: str) -> str:
+    """
+        Lowercase, NFC and collapse whitespace so the same message always looks the same
+    """
+    return " ".join(unicodedata.normalize("NFC", text).lower().split())
+
+def fold(text: str) -> str:
+    """
+        Remove diacritics, "chi tiêu" -> "chi tieu"
+    """
+    text = unicodedata.normalize("NFD", normalize(text)).replace("đ", "d")
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+def _compile_keywords(keywords: dict) -> list:
+    compiled = []
+    for label, words in keywords.items():
+        for word in words:
+            compiled.append((label, len(word), re.compile(rf"(?<!\w){re.escape(word)}(?!\w)")))
+            # too short once folded, e.g. "ăn" -> "an"
+            if len(fold(word)) > 3 and fold(word) != word:
+                compiled.append((label, len(word), re.compile(rf"(?<!\w){re.escape(fold(word))}(?!\w)")))
+    # longest keyword first so "trả nợ" beats "trả"
+    return sorted(compiled, key=lambda item: -item[1])
+
+_CATEGORY_PATTERNS = _compile_keywords(CATEGORY_KEYWORDS)
+_TYPE_PATTERNS = _compile_keywords(TYPE_KEYWORDS)
+
+def _match(patterns: list, text: str) -> Optional[str]:
+    text = normalize(text)
+    for label, _, pattern in patterns:
+        if pattern.search(text):
+            return label
+    return None
+
+def _hits(patterns: list, text: str) -> List[str]:
+    text = normalize(text)
+    taken, labels = [], []
+    for label, _, pattern in patterns:
+        for match in pattern.finditer(text):
+            # a longer keyword already covers it, "được cho" is not also "cho"
+            if any(match.start() < end and start < match.end() for start, end in taken):
+                continue
+            taken.append(match.span())
+            labels.append(label)
+    return labels
+
+def match_category(text: str) -> Optional[str]:
+    return _match(_CATEGORY_PATTERNS, text)
+
+def match_type(text: str) -> Optional[str]:
+    return _match(_TYPE_PATTERNS, text)
+
+def category_hits(text: str) -> List[str]:
+    """
+        Category of every keyword in the text, longest keyword first, overlapping shorter ones skipped
+    """
+    return _hits(_CATEGORY_PATTERNS, text)
+
+def type_hits(text: str) -> List[str]:
+    return _hits(_TYPE_PATTERNS, text)
+
+def _to_number(digits: str, has_unit: bool) -> float:
+    if has_unit:
+        # "1,5tr" / "1.5tr" are decimals, "1.500k" is a thousands separator
+        parts = re.split(r"[.,]", digits)
+        if len(parts) == 2 and len(parts[1]) != 3:
+            return float(f"{parts[0]}.{parts[1]}")
+    return float(re.sub(r"[.,]", "", digits))
+
+def parse_amounts(text: str) -> Iterator[Tuple[float, bool]]:
+    """
+        Every money amount in the text with whether it had a unit: "50k" -> (50000, True), "100.000" -> (100000, False)
+    """
+    for match in AMOUNT_PATTERN.finditer(normalize(text)):
+        digits, unit, tail = match.groups()
+        if unit is None:
+            # bare numbers below 1000 are quantities or days and 19xx/20xx are years, not money
+            number = _to_number(digits, False)
+            if tail or number < 1000 or (digits.isdigit() and 1900 <= number <= 2100):
+                continue
+            yield number, False
+            continue
+
+        multiplier = UNITS[unit.lower()]
+        amount = _to_number(digits, True) * multiplier
+        if tail and multiplier >= 1000:
+            # "1tr2" = 1.2tr, "2k5" = 2.5k
+            amount += float(f"0.{tail}") * multiplier
+        yield amount, True
+
+def parse_amount(text: str) -> Optional[float]:
+    """
+        First money amount in the text: "50k", "1tr2", "1.5 triệu", "100.000đ", "1b" -> VND
+    """
+    for amount, _ in parse_amounts(text):
+        return amount
+    return None
+
+def parse_date(text: str, today: date = None) -> Optional[date]:
+    """
+        First explicit date in the text, "2025-03-01" or "1/3/2025" ("1/3" is this year)
+    """
+    today = today or date.today()
+    match = ISO_DATE_PATTERN.search(text)
+    try:
+        if match:
+            return date(int(match[1]), int(match[2]), int(match[3]))
+        match = VN_DATE_PATTERN.search(text)
+        if match:
+            return date(int(match[3] or today.year), int(match[2]), int(match[1]))
+    except ValueError:
+        return None
+    return None
+
+def _month_range(year: int, month: int) -> Tuple[date, date]:
+    start = date(year, month, 1)
+    end = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return start, end
+
+def parse_date_range(text: str, today: date = None) -> Optional[Tuple[date, date]]:
+    """
+        Date range from phrases like "hôm nay", "tuần trước", "tháng này", "tháng 3", "từ 1/3 đến 15/3"
+    """
+    today = today or date.today()
+    text = normalize(text)
+    folded = fold(text)
+
+    if "hom nay" in folded:
+        return today, today
+    if "hom qua" in folded:
+        yesterday = today - timedelta(days=1)
+        return yesterday, yesterday
+    if "tuan nay" in folded:
+        return today - timedelta(days=today.weekday()), today
+    if "tuan truoc" in folded:
+        start = today - timedelta(days=today.weekday() + 7)
+        return start, start + timedelta(days=6)
+    if "thang nay" in folded:
+        return today.replace(day=1), today
+    if "thang truoc" in folded:
+        last = today.replace(day=1) - timedelta(days=1)
+        return _month_range(last.year, last.month)
+    if "nam nay" in folded:
+        return date(today.year, 1, 1), today
+    if "nam ngoai" in folded or "nam truoc" in folded:
+        return date(today.year - 1, 1, 1), date(today.year - 1, 12, 31)
+
+    match = MONTH_PATTERN.search(text)
+    if match and 1 <= int(match[1]) <= 12:
+        return _month_range(int(match[2] or today.year), int(match[1]))
+
+    dates = []
+    for match in ISO_DATE_PATTERN.finditer(text):
+        dates.append(parse_date(match[0], today))
+    for match in VN_DATE_PATTERN.finditer(text):
+        dates.append(parse_date(match[0], today))
+    dates = sorted(d for d in dates if d)
+    if len(dates) >= 2:
+        return dates[0], dates[-1]
+    if len(dates) == 1:
+        return (dates[0], today) if "từ" in text or "tu " in folded else (dates[0], dates[0])
+    return None
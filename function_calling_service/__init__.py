@@ -6,4 +6,7 @@ async def response_AI(query: str, req: Request):
     result = await registry.process_query(query, req)
     return result
 
-__all__ = ["response_AI"]
\ No newline at end of file
+def response_AI_stream(query: str, req: Request):
+    return registry.process_query_stream(query, req)
+
+__all__ = ["response_AI", "response_AI_stream"]
\ No newline at end of file
@@ -0,0 +1,62 @@
+from fastapi import Request
+from function_calling_service.backend import paginate_pages
+from dotenv import load_dotenv
+import pandas as pd
+import os
+
+load_dotenv()
+
+# rows per backend page when walking the whole history (the backend serves at most 10), and a hard stop on pages
+AGGREGATE_PAGE_SIZE = int(os.getenv("AGGREGATE_PAGE_SIZE", 10))
+AGGREGATE_MAX_PAGES = int(os.getenv("AGGREGATE_MAX_PAGES", 1000))
+# field of an expense holding its date
+EXPENSE_DATE_FIELD = os.getenv("EXPENSE_DATE_FIELD", "createdAt")
+
+# date bucket -> pandas period
+BUCKETS = {
+    "day": "D", "week": "W", "month": "M", "year": "Y",
+    "ngày": "D", "tuần": "W", "tháng": "M", "năm": "Y",
+}
+
+def filters(**params) -> dict:
+    return {key: value for key, value in params.items() if value is not None}
+
+def _group_key(frame: pd.DataFrame, by: str, bucket: str = None) -> pd.Series:
+    if bucket is None:
+        return frame[by].fillna("khác")
+    dates = pd.to_datetime(frame[EXPENSE_DATE_FIELD], errors="coerce", utc=True).dt.tz_localize(None)
+    periods = dates.dt.to_period(BUCKETS[bucket])
+    # missing or invalid dates stay NaN and groupby leaves them out instead of a "NaT" bucket
+    return periods.astype(str).where(periods.notna())
+
+async def totals(req: Request, params: dict, by: str, bucket: str = None) -> dict:
+    """
+        Sum and count of amount grouped by a field (or date bucket), aggregated page by page
+        so memory stays bounded by the prefetch window whatever the history size
+    """
+    fields = ("amount", EXPENSE_DATE_FIELD if bucket else by)
+    result = None
+    undated = 0
+    async for rows in paginate_pages(req, "/expense/get-expense", params, AGGREGATE_PAGE_SIZE, AGGREGATE_MAX_PAGES, fields):
+        frame = pd.DataFrame(rows, columns=list(fields))
+        frame["amount"] = pd.to_numeric(frame["amount"], errors="coerce").fillna(0)
+        keys = _group_key(frame, by, bucket)
+        undated += int(keys.isna().sum())
+        part = frame.groupby(keys)["amount"].agg(["sum", "count"])
+        result = part if result is None else result.add(part, fill_value=0)
+
+    extra = {"undated_count": undated} if bucket else {}
+    if result is None or result.empty:
+        return {"totals": [], "total_amount": 0.0, "transaction_count": 0, **extra}
+
+    # dates read in order, everything else biggest first
+    result = result.sort_index() if bucket else result.sort_values("sum", ascending=False)
+    return {
+        "totals": [
+            {by: key, "total_amount": float(row["sum"]), "transaction_count": int(row["count"])}
+            for key, row in result.iterrows()
+        ],
+        "total_amount": float(result["sum"].sum()),
+        "transaction_count": int(result["count"].sum()),
+        **extra
+    }
@@ -0,0 +1,160 @@
+from typing import AsyncIterator
+from collections import deque
+from fastapi import Request
+from cachetools import TTLCache
+from dotenv import load_dotenv
+from common.context import user_id
+from common.timing import span
+from common.metrics import BACKEND_SECONDS
+from function_calling_service.records import Expense
+import asyncio
+import random
+import time
+import httpx
+import os
+
+load_dotenv()
+
+URL = os.getenv("NODE_URL")
+# seconds
+BACKEND_TIMEOUT = float(os.getenv("BACKEND_TIMEOUT", 10))
+BACKEND_CONNECT_TIMEOUT = float(os.getenv("BACKEND_CONNECT_TIMEOUT", 3))
+BACKEND_MAX_CONNECTIONS = int(os.getenv("BACKEND_MAX_CONNECTIONS", 100))
+BACKEND_MAX_KEEPALIVE = int(os.getenv("BACKEND_MAX_KEEPALIVE", 20))
+BACKEND_RETRIES = int(os.getenv("BACKEND_RETRIES", 2))
+BACKEND_BACKOFF = float(os.getenv("BACKEND_BACKOFF", 0.2))
+# h2 is only negotiated over https, plain http keeps using keep-alive HTTP/1.1
+BACKEND_HTTP2 = os.getenv("BACKEND_HTTP2", "true").lower() == "true"
+
+# per user cache of backend responses
+BACKEND_CACHE_TTL = float(os.getenv("BACKEND_CACHE_TTL", 30))
+BACKEND_CACHE_MAX_BYTES = int(os.getenv("BACKEND_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+# pages requested ahead of the consumer when walking a whole history
+PAGINATE_PREFETCH = int(os.getenv("PAGINATE_PREFETCH", 4))
+
+RETRY_STATUS = {429, 502, 503, 504}
+
+
+# (user id, path, params) -> (json, response size), least recently used entries go first once full
+cache = TTLCache(maxsize=BACKEND_CACHE_MAX_BYTES, ttl=BACKEND_CACHE_TTL, getsizeof=lambda value: value[1])
+
+client = httpx.AsyncClient(
+    base_url=URL or "",
+    http2=BACKEND_HTTP2,
+    timeout=httpx.Timeout(BACKEND_TIMEOUT, connect=BACKEND_CONNECT_TIMEOUT),
+    limits=httpx.Limits(max_connections=BACKEND_MAX_CONNECTIONS, max_keepalive_connections=BACKEND_MAX_KEEPALIVE)
+)
+
+def auth_headers(req: Request) -> dict:
+    accessToken = req.headers.get("Authorization")
+    return {
+        "Content-Type": "application/json",
+        'Authorization': f'Bearer {accessToken}'
+    }
+
+def cache_key(req: Request, path: str, params: dict = None):
+    uid = user_id(getattr(req.state, "user", None))
+    if uid is None:
+        return None
+    return uid, path, tuple(sorted((params or {}).items()))
+
+def invalidate_user(uid: str) -> int:
+    """
+        Drop every cached response of the user, call it when the user records a new transaction
+    """
+    keys = [key for key in list(cache.keys()) if key[0] == uid]
+    for key in keys:
+        cache.pop(key, None)
+    return len(keys)
+
+async def get_json(req: Request, path: str, params: dict = None, timeout: float = None) -> dict:
+    """
+        GET an endpoint of the expense backend through the per user cache
+    """
+    key = cache_key(req, path, params) if BACKEND_CACHE_TTL > 0 else None
+    if key is not None and key in cache:
+        return cache[key][0]
+
+    data, size = await fetch_json(req, path, params, timeout)
+    if key is not None and size <= cache.maxsize:
+        cache[key] = (data, size)
+    return data
+
+async def fetch_json(req: Request, path: str, params: dict = None, timeout: float = None):
+    """
+        GET an endpoint of the expense backend, retrying transient failures with exponential backoff.
+        Returns (json, response size)
+    """
+    for attempt in range(BACKEND_RETRIES + 1):
+        try:
+            start = time.perf_counter()
+            status = "error"
+            try:
+                with span("backend", path=path) as attributes:
+                    response = await client.get(
+                        path,
+                        headers=auth_headers(req),
+                        params=params,
+                        timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT
+                    )
+                    status = attributes["status"] = response.status_code
+            finally:
+                BACKEND_SECONDS.labels(path, str(status)).observe(time.perf_counter() - start)
+            if response.status_code not in RETRY_STATUS or attempt == BACKEND_RETRIES:
+                response.raise_for_status()
+                return response.json(), len(response.content)
+        except httpx.TransportError:
+            if attempt == BACKEND_RETRIES:
+                raise
+        await asyncio.sleep(BACKEND_BACKOFF * 2 ** attempt * (1 + random.random()))
+
+def project(expense: dict, fields: tuple) -> dict:
+    return {field: expense.get(field) for field in fields}
+
+async def expense_page(req: Request, path: str, params: dict, key: str = "Expenses") -> dict:
+    """
+        One page of expenses in the shape every list tool returns
+    """
+    response_json = await get_json(req, path, params)
+    results = [Expense.from_json(expense) for expense in response_json['metadata'][key]]
+    return {"expenses": results, "total_count": len(results)}
+
+async def paginate_pages(req: Request, path: str, params: dict, page_size: int, max_pages: int, fields: tuple = None,
+                         key: str = "Expenses", prefetch: int = PAGINATE_PREFETCH) -> AsyncIterator[list]:
+    """
+        Yield the pages of a paginated endpoint in order as compact records, Expense or the given
+        fields with project(), until an empty page. A short page is not the end, the backend may
+        serve fewer rows than page_size. Up to prefetch pages are fetched concurrently, the window
+        starts at one page and doubles so short histories don't pay for pages past their end
+    """
+    async def fetch(page: int):
+        response_json = await get_json(req, path, {**params, "page": page, "pageSize": page_size})
+        rows = response_json['metadata'][key]
+        if fields is None:
+            return [Expense.from_json(expense) for expense in rows]
+        return [project(expense, fields) for expense in rows]
+
+    pending = deque()
+    next_page = 1
+    window = 1
+    try:
+        while True:
+            while len(pending) < window and next_page <= max_pages:
+                pending.append(asyncio.create_task(fetch(next_page)))
+                next_page += 1
+            if not pending:
+                return
+
+            rows = await pending.popleft()
+            if not rows:
+                return
+            yield rows
+            window = min(window * 2, max(prefetch, 1))
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+async def aclose():
+    await client.aclose()
@@ -1,12 +1,11 @@
 from function_calling_service.register import FunctionRegistry
-import requests
+from function_calling_service.backend import get_json, expense_page
+from function_calling_service.records import Expense
+from function_calling_service import summary
+from function_calling_service.aggregate import totals, filters, BUCKETS
+from common.vietnamese import CATEGORIES, TYPES
 from fastapi import Request
-import os
-from dotenv import load_dotenv
 from datetime import date
-load_dotenv()
-
-URL = os.getenv("NODE_URL") 
 
 registry = FunctionRegistry()
 
@@ -35,31 +34,23 @@ registry = FunctionRegistry()
                 }
             }
         },
-        required=[]
+        required=[],
+        summarizer=summary.expense_list,
+        examples=[
+            "chi tiêu gần đây",
+            "xem các giao dịch gần đây",
+            "liệt kê chi tiêu của tôi",
+            "giao dịch mới nhất",
+            "cho tôi xem lịch sử giao dịch",
+            "5 giao dịch gần nhất"
+        ]
 )
-def get_expenses(req: Request, page: int = 1, pageSize: int = 5):
-    accessToken = req.headers.get("Authorization")
-    headers = {
-        "Content-Type": "application/json",
-        'Authorization': f'Bearer {accessToken}'
-    }
+async def get_expenses(req: Request, page: int = 1, pageSize: int = 5):
     params = {
         "page": page,
         "pageSize": pageSize
     }
-    response = requests.get(f"{URL}/expense/get-expense", headers=headers, params=params)
-    response_json = response.json()
-
-    results = []
-    expenses_list = response_json['metadata']['Expenses']
-    for expense in expenses_list:
-        results.append({
-            "amount": expense['amount'],
-            "category": expense['category'],
-            "description": expense['description']
-        })
-    
-    return {"expenses": results, "total_count": len(results)}
+    return await expense_page(req, "/expense/get-expense", params)
 
 @registry.register(
     name="function.get_expense_by_amount",
@@ -95,14 +86,18 @@ def get_expenses(req: Request, page: int = 1, pageSize: int = 5):
             }
         }
     },
-    required=["amount"]
+    required=["amount"],
+    summarizer=summary.expense_list,
+    examples=[
+        "giao dịch 50k",
+        "khoản chi 100 nghìn",
+        "tìm giao dịch 200000",
+        "giao dịch có số tiền 1tr",
+        "khoản nào 500k",
+        "chi tiêu bằng 300k"
+    ]
 )
-def get_expense_by_amount(req: Request, amount: float, sinceBy: date = None, page: int = 1, pageSize: int = 5):
-    accessToken = req.headers.get("Authorization")
-    headers = {
-        "Content-Type": "application/json",
-        'Authorization': f'Bearer {accessToken}'
-    }
+async def get_expense_by_amount(req: Request, amount: float, sinceBy: date = None, page: int = 1, pageSize: int = 5):
     if not sinceBy:
         sinceBy = date(2025, 1, 1)
     params = {
@@ -110,19 +105,7 @@ def get_expense_by_amount(req: Request, amount: float, sinceBy: date = None, pag
         "sinceBy": str(sinceBy)
     }
     
-    response = requests.get(f"{URL}/expense/getExpenseByAmount", headers=headers, params=params)
-    
-    response_json = response.json()
-    results = []
-    expenses_list = response_json['metadata']['expense']
-    for expense in expenses_list:
-        results.append({
-            "amount": expense['amount'],
-            "category": expense['category'],
-            "description": expense['description']
-        })
-    
-    return {"expenses": results, "total_count": len(results)}
+    return await expense_page(req, "/expense/getExpenseByAmount", params, key="expense")
 
 @registry.register(
         name="function.get_expense_by_category",
@@ -137,6 +120,7 @@ def get_expense_by_amount(req: Request, amount: float, sinceBy: date = None, pag
                 "category": {
                     "type": "string",
                     "description": "The category the user asks for. Category have to be one of the following: 'giải trí', 'mua sắm', 'di chuyển', 'sức khỏe', 'ăn uống', 'hóa đơn', 'nợ', 'khác'",
+                    "enum": CATEGORIES,
                     "default": "khác"
                 },
                 "page": {
@@ -154,34 +138,27 @@ def get_expense_by_amount(req: Request, amount: float, sinceBy: date = None, pag
                 }
             }
         },
-        required=["category"]
+        required=["category"],
+        summarizer=summary.expense_list,
+        examples=[
+            "chi tiêu ăn uống",
+            "tiền di chuyển",
+            "chi cho mua sắm",
+            "chi tiêu giải trí",
+            "các khoản hóa đơn",
+            "chi phí sức khỏe",
+            "tiền ăn",
+            "khoản nợ"
+        ]
 )
-def get_expense_by_category(req: Request, category: str, page: int = 1, pageSize: int = 5):
-    accessToken = req.headers.get("Authorization")
-    headers = {
-        "Content-Type": "application/json",
-        'Authorization': f'Bearer {accessToken}'
-    }
-
+async def get_expense_by_category(req: Request, category: str, page: int = 1, pageSize: int = 5):
     params = {
         "category": category,
         "page": page,
         "pageSize": pageSize        
     }
 
-    response = requests.get(f"{URL}/expense/get-expense", headers=headers, params=params)
-    response_json = response.json()
-
-    results = []
-    expenses_list = response_json['metadata']['Expenses']
-    for expense in expenses_list:
-        results.append({
-            "amount": expense['amount'],
-            "category": expense['category'],
-            "description": expense['description']
-        })
-    
-    return {"expenses": results, "total_count": len(results)}
+    return await expense_page(req, "/expense/get-expense", params)
 
 @registry.register(
         name="function.get_expense_by_type",
@@ -196,6 +173,7 @@ def get_expense_by_category(req: Request, category: str, page: int = 1, pageSize
                 "type": {
                     "type": "string",
                     "description": "The category the user asks for. type have to be one of the following: 'gửi', 'nhận'. Example 'chi' = 'gửi', 'thu' = 'nhận'",
+                    "enum": TYPES,
                     "default": "gửi"
                 },
                 "page": {
@@ -213,34 +191,26 @@ def get_expense_by_category(req: Request, category: str, page: int = 1, pageSize
                 }
             }
         },
-        required=["type"]
+        required=["type"],
+        summarizer=summary.expense_list,
+        examples=[
+            "các khoản đã nhận",
+            "tiền nhận được",
+            "các khoản thu",
+            "tiền đã gửi đi",
+            "các khoản chi ra",
+            "tiền tôi đã chuyển đi",
+            "giao dịch nhận tiền"
+        ]
 )
-def get_expense_by_type(req: Request, type: str, page: int = 1, pageSize: int = 5):
-    accessToken = req.headers.get("Authorization")
-    headers = {
-        "Content-Type": "application/json",
-        'Authorization': f'Bearer {accessToken}'
-    }
-
+async def get_expense_by_type(req: Request, type: str, page: int = 1, pageSize: int = 5):
     params = {
         "type": type,
         "page": page,
         "pageSize": pageSize        
     }
 
-    response = requests.get(f"{URL}/expense/get-expense", headers=headers, params=params)
-    response_json = response.json()
-
-    results = []
-    expenses_list = response_json['metadata']['Expenses']
-    for expense in expenses_list:
-        results.append({
-            "amount": expense['amount'],
-            "category": expense['category'],
-            "description": expense['description']
-        })
-    
-    return {"expenses": results, "total_count": len(results)}
+    return await expense_page(req, "/expense/get-expense", params)
 
 @registry.register(
         name="function.get_max_expense",
@@ -254,28 +224,26 @@ def get_expense_by_type(req: Request, type: str, page: int = 1, pageSize: int =
                 }
             }
         },
-        required=[]
+        required=[],
+        summarizer=summary.single_expense("lớn nhất"),
+        examples=[
+            "chi tiêu lớn nhất",
+            "giao dịch lớn nhất",
+            "khoản chi nhiều nhất",
+            "tiêu nhiều tiền nhất vào đâu",
+            "khoản đắt nhất",
+            "giao dịch nhiều tiền nhất"
+        ],
+        intents=["max"]
 )     
-def get_max_expense(req: Request):
-    accessToken = req.headers.get("Authorization")
-    headers = {
-        "Content-Type": "application/json",
-        'Authorization': f'Bearer {accessToken}'
-    }
-
+async def get_max_expense(req: Request):
     params = {
         "option": -1
     }
 
-    response = requests.get(f"{URL}/expense/sortExpenses", headers=headers, params=params)
-
-    response_json = response.json()
+    response_json = await get_json(req, "/expense/sortExpenses", params)
     max_expense = response_json.get('metadata', {}).get('expense', [])[0]
-    return {"expenses": {
-        "amount": max_expense['amount'],
-        "category": max_expense['category'],
-        "description": max_expense['description']
-    }}
+    return {"expenses": Expense.from_json(max_expense)}
 
 @registry.register(
         name="function.get_min_expense",
@@ -289,28 +257,25 @@ def get_max_expense(req: Request):
                 }
             }
         },
-        required=[]
+        required=[],
+        summarizer=summary.single_expense("nhỏ nhất"),
+        examples=[
+            "chi tiêu nhỏ nhất",
+            "giao dịch nhỏ nhất",
+            "khoản chi ít nhất",
+            "khoản rẻ nhất",
+            "giao dịch ít tiền nhất"
+        ],
+        intents=["min"]
 )
-def get_min_expense(req: Request):
-    accessToken = req.headers.get("Authorization")
-    headers = {
-        "Content-Type": "application/json",
-        'Authorization': f'Bearer {accessToken}'
-    }
-
+async def get_min_expense(req: Request):
     params = {
         "option": 1
     }
 
-    response = requests.get(f"{URL}/expense/sortExpenses", headers=headers, params=params)
-
-    response_json = response.json()
+    response_json = await get_json(req, "/expense/sortExpenses", params)
     min_expense = response_json.get('metadata', {}).get('expense', [])[0]
-    return {"expenses": {
-        "amount": min_expense['amount'],
-        "category": min_expense['category'],
-        "description": min_expense['description']
-    }}
+    return {"expenses": Expense.from_json(min_expense)}
 
 @registry.register(
         name="function.get_expense_by_date",
@@ -347,15 +312,19 @@ def get_min_expense(req: Request):
                 }
             }
         },
-        required=[]
+        required=[],
+        summarizer=summary.expense_list,
+        examples=[
+            "chi tiêu tháng này",
+            "giao dịch hôm nay",
+            "chi tiêu tuần trước",
+            "giao dịch tháng trước",
+            "chi tiêu từ 1/3 đến 15/3",
+            "giao dịch hôm qua",
+            "chi tiêu năm nay"
+        ]
 )
-def get_expense_by_date(req: Request, start: date = "2025-01-01", end: date = "2029-01-01", page: int = 1, pageSize: int = 5):
-    accessToken = req.headers.get("Authorization")
-    headers = {
-        "Content-Type": "application/json",
-        'Authorization': f'Bearer {accessToken}'
-    }
-
+async def get_expense_by_date(req: Request, start: date = "2025-01-01", end: date = "2029-01-01", page: int = 1, pageSize: int = 5):
     params = {
         "startDate": start,
         "endDate": end,
@@ -363,19 +332,7 @@ def get_expense_by_date(req: Request, start: date = "2025-01-01", end: date = "2
         "pageSize": pageSize
     }
 
-    response = requests.get(f"{URL}/expense/get-expense", headers=headers, params=params)
-
-    response_json = response.json()
-    results = []
-    expenses_list = response_json['metadata']['Expenses']
-    for expense in expenses_list:
-        results.append({
-            "amount": expense['amount'],
-            "category": expense['category'],
-            "description": expense['description']
-        })
-    
-    return {"expenses": results, "total_count": len(results)}
+    return await expense_page(req, "/expense/get-expense", params)
 
 @registry.register(
         name="function.search_expenses",
@@ -406,34 +363,22 @@ def get_expense_by_date(req: Request, start: date = "2025-01-01", end: date = "2
                 }
             }
         },
-        required=["keySearch"]
+        required=["keySearch"],
+        summarizer=summary.expense_list,
+        examples=[
+            "tìm giao dịch có chữ",
+            "tìm kiếm chi tiêu",
+            "search giao dịch"
+        ]
 )
-def search_expenses(req: Request, keySearch: str, page: int = 1, pageSize: int = 5):
-    accessToken = req.headers.get("Authorization")
-    headers = {
-        "Content-Type": "application/json",
-        'Authorization': f'Bearer {accessToken}'
-    }  
-    
+async def search_expenses(req: Request, keySearch: str, page: int = 1, pageSize: int = 5):
     params = {
         "searchText": keySearch,
         'page': page,
         'pageSize': pageSize
     }
 
-    response = requests.get(f"{URL}/expense/get-expense", headers=headers, params=params)
-
-    response_json = response.json()
-    results = []
-    expenses_list = response_json['metadata']['Expenses']
-    for expense in expenses_list:
-        results.append({
-            "amount": expense['amount'],
-            "category": expense['category'],
-            "description": expense['description']
-        })
-    
-    return {"expenses": results, "total_count": len(results)}
+    return await expense_page(req, "/expense/get-expense", params)
 
 @registry.register(
         name="function.most_transaction_partner",
@@ -447,34 +392,199 @@ def search_expenses(req: Request, keySearch: str, page: int = 1, pageSize: int =
                 }
             }
         },
-        required=[]
+        required=[],
+        summarizer=summary.top_partner,
+        examples=[
+            "giao dịch nhiều nhất với ai",
+            "người giao dịch nhiều nhất",
+            "đối tác giao dịch nhiều nhất",
+            "tôi chuyển tiền cho ai nhiều nhất",
+            "ai giao dịch với tôi nhiều nhất"
+        ],
+        intents=["max"]
 )
-def most_transaction_partner(req: Request):
-    accessToken = req.headers.get("Authorization")
-    headers = {
-        "Content-Type": "application/json",
-        'Authorization': f'Bearer {accessToken}'
-    }
-
+async def most_transaction_partner(req: Request):
     params = {
         "option": -1
     }
 
-    response = requests.get(f"{URL}/expense/sortPartner", headers=headers, params=params)
+    response_json = await get_json(req, "/expense/sortPartner", params)
+    partner = response_json["metadata"]["expense"][0]
 
-    response_json = response.json()
-    metadata = response_json["metadata"]
-    expense_list = metadata["expense"]
-    partner = expense_list[0]
-    name = partner["_id"]
-    amount = partner["amount"]
-    transactions = partner["list"]
-    
+    # only the count, the transaction list would be sent to the summarizer for nothing
     return {
         "partner": {
-            "name": name,
-            "total_amount": float(amount),
-            "transaction_count": len(transactions),
-            "transactions": transactions
+            "name": partner["_id"],
+            "total_amount": float(partner["amount"]),
+            "transaction_count": len(partner["list"])
         }
     }
+
+@registry.register(
+        name="function.total_by_category",
+        description="Get the total amount and number of transactions for each category, optionally within a date range. Use it for questions about how much was spent in total",
+        parameters={
+            "type": "object",
+            "properties": {
+                "req": {
+                    "type": "Request",
+                    "description": "Request object of FastAPI"
+                },
+                "type": {
+                    "type": "string",
+                    "description": "Optional, only count sent ('gửi') or received ('nhận') transactions",
+                    "enum": TYPES
+                },
+                "start": {
+                    "type": "date",
+                    "description": "Optional start date of the date range. Format: YYYY-MM-DD"
+                },
+                "end": {
+                    "type": "date",
+                    "description": "Optional end date of the date range. Format: YYYY-MM-DD"
+                }
+            }
+        },
+        required=[],
+        summarizer=summary.totals("category", "Theo hạng mục"),
+        examples=[
+            "tổng chi tiêu theo hạng mục",
+            "tháng này tiêu bao nhiêu cho mỗi loại",
+            "chi tiêu theo danh mục",
+            "tôi tiêu nhiều nhất vào hạng mục nào",
+            "tổng tiền từng hạng mục"
+        ],
+        intents=["total", "max"]
+)
+async def total_by_category(req: Request, type: str = None, start: date = None, end: date = None):
+    params = filters(type=type, startDate=start, endDate=end)
+    return await totals(req, params, "category")
+
+@registry.register(
+        name="function.total_by_type",
+        description="Get the total amount sent ('gửi') and received ('nhận'), optionally for one category or within a date range",
+        parameters={
+            "type": "object",
+            "properties": {
+                "req": {
+                    "type": "Request",
+                    "description": "Request object of FastAPI"
+                },
+                "category": {
+                    "type": "string",
+                    "description": "Optional, only count this category",
+                    "enum": CATEGORIES
+                },
+                "start": {
+                    "type": "date",
+                    "description": "Optional start date of the date range. Format: YYYY-MM-DD"
+                },
+                "end": {
+                    "type": "date",
+                    "description": "Optional end date of the date range. Format: YYYY-MM-DD"
+                }
+            }
+        },
+        required=[],
+        summarizer=summary.totals("type", "Theo loại"),
+        examples=[
+            "tổng thu chi",
+            "tổng tiền đã gửi và đã nhận",
+            "tháng này thu bao nhiêu chi bao nhiêu",
+            "tổng thu nhập",
+            "tổng tiền nhận được",
+            "tổng chi tiêu ăn uống tháng này",
+            "tháng 3 chi bao nhiêu cho mua sắm"
+        ],
+        intents=["total"]
+)
+async def total_by_type(req: Request, category: str = None, start: date = None, end: date = None):
+    params = filters(category=category, startDate=start, endDate=end)
+    return await totals(req, params, "type")
+
+@registry.register(
+        name="function.total_by_date",
+        description="Get the total amount and number of transactions per day, week, month or year, optionally for one category",
+        parameters={
+            "type": "object",
+            "properties": {
+                "req": {
+                    "type": "Request",
+                    "description": "Request object of FastAPI"
+                },
+                "bucket": {
+                    "type": "string",
+                    "description": "Size of each period",
+                    "enum": list(BUCKETS),
+                    "default": "month"
+                },
+                "category": {
+                    "type": "string",
+                    "description": "Optional, only count this category",
+                    "enum": CATEGORIES
+                },
+                "start": {
+                    "type": "date",
+                    "description": "Optional start date of the date range. Format: YYYY-MM-DD"
+                },
+                "end": {
+                    "type": "date",
+                    "description": "Optional end date of the date range. Format: YYYY-MM-DD"
+                }
+            }
+        },
+        required=[],
+        summarizer=summary.totals("date", "Theo thời gian", limit=12),
+        examples=[
+            "chi tiêu theo từng tháng",
+            "mỗi tháng tiêu bao nhiêu",
+            "tổng chi tiêu theo ngày",
+            "chi tiêu từng tuần",
+            "so sánh chi tiêu các tháng"
+        ],
+        intents=["total"]
+)
+async def total_by_date(req: Request, bucket: str = "month", category: str = None, start: date = None, end: date = None):
+    params = filters(category=category, startDate=start, endDate=end)
+    return await totals(req, params, "date", bucket=bucket)
+
+@registry.register(
+        name="function.top_partners",
+        description="Get the top partners the user has transactions with, with their total amount and number of transactions",
+        parameters={
+            "type": "object",
+            "properties": {
+                "req": {
+                    "type": "Request",
+                    "description": "Request object of FastAPI"
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Number of partners to return",
+                    "minimum": 1,
+                    "maximum": 10,
+                    "default": 3
+                }
+            }
+        },
+        required=[],
+        summarizer=summary.top_partners,
+        examples=[
+            "top những người giao dịch nhiều nhất",
+            "3 người tôi giao dịch nhiều nhất",
+            "danh sách đối tác giao dịch nhiều",
+            "những ai tôi hay chuyển tiền"
+        ],
+        intents=["max"]
+)
+async def top_partners(req: Request, limit: int = 3):
+    # the backend already groups by partner, only keep the counts instead of the transaction lists
+    response_json = await get_json(req, "/expense/sortPartner", {"option": -1})
+    partners = []
+    for partner in response_json["metadata"]["expense"][:limit]:
+        partners.append({
+            "name": partner["_id"],
+            "total_amount": float(partner["amount"]),
+            "transaction_count": len(partner["list"])
+        })
+    return {"partners": partners}
@@ -1,5 +1,5 @@
-from dataclasses import dataclass
-from typing import Callable, List
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
 
 @dataclass
 class Function:
@@ -7,4 +7,11 @@ class Function:
     description: str
     parameters: dict
     function: Callable
-    required: List[str]
\ No newline at end of file
+    required: List[str]
+    summarizer: Optional[Callable] = None  # template summary, None means the LLM summarizes
+    examples: List[str] = field(default_factory=list)  # sample queries for the local router
+    intents: List[str] = field(default_factory=list)  # "total", "max", "min" questions the tool answers, for the local router
+    # compiled at registration
+    tool: dict = None  # payload sent to the LLM
+    needs_req: bool = False
+    coerce: Callable = None  # arguments from the LLM -> (arguments of the function, repaired fields)
@@ -0,0 +1,132 @@
+from typing import Any, List, NamedTuple
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+# hard budget of the tool results sent to the summarizer, in (estimated) tokens
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", 800))
+# Vietnamese with diacritics tokenizes to roughly 3 characters per token
+CHARS_PER_TOKEN = 3
+MAX_TEXT = 60
+
+
+class Expense(NamedTuple):
+    """
+        Compact expense record shared by every tool
+    """
+    amount: float
+    category: str
+    description: str
+
+    @classmethod
+    def from_json(cls, expense: dict) -> "Expense":
+        return cls(expense.get("amount"), expense.get("category"), expense.get("description"))
+
+
+def to_json(value: Any) -> Any:
+    """
+        Turn the records inside tool results back into the {"amount", "category", "description"} dicts of the API
+    """
+    if isinstance(value, Expense):
+        return value._asdict()
+    if isinstance(value, dict):
+        return {key: to_json(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_json(item) for item in value]
+    return value
+
+
+def _format(value: Any) -> str:
+    if isinstance(value, float):
+        return str(int(round(value)))
+    if value is None:
+        return ""
+    text = str(value).replace("|", "/").replace("\n", " ")
+    return text if len(text) <= MAX_TEXT else text[:MAX_TEXT - 1] + "…"
+
+def _is_scalar(value: Any) -> bool:
+    return not isinstance(value, (dict, list, Expense))
+
+
+class _Writer:
+    def __init__(self, limit: int):
+        self.lines = []
+        self.size = 0
+        self.limit = limit
+
+    def add(self, line: str, force: bool = False) -> bool:
+        if not force and self.size + len(line) + 1 > self.limit:
+            return False
+        self.lines.append(line)
+        self.size += len(line) + 1
+        return True
+
+
+def _table(name: str, rows: list, writer: _Writer):
+    if isinstance(rows[0], Expense):
+        columns = list(Expense._fields)
+        values = [list(row) for row in rows]
+    else:
+        columns = [key for key, value in rows[0].items() if _is_scalar(value)]
+        values = [[row.get(column) for column in columns] for row in rows]
+
+    header = f"{name}: {len(rows)} rows"
+    for column in ("amount", "total_amount"):
+        if column in columns:
+            index = columns.index(column)
+            total = sum(float(row[index] or 0) for row in values)
+            header += f", sum {column}={_format(total)}"
+    writer.add(header, force=True)
+
+    # categories repeat a lot, send each one once and use its number in the rows
+    if "category" in columns:
+        index = columns.index("category")
+        codes = {}
+        for row in values:
+            row[index] = codes.setdefault(row[index], len(codes))
+        writer.add(f"{name}.category: " + " ".join(f"{code}={_format(category)}" for category, code in codes.items()), force=True)
+
+    writer.add("|".join(columns), force=True)
+    for written, row in enumerate(values):
+        if not writer.add("|".join(_format(value) for value in row)):
+            writer.add(f"... +{len(values) - written} rows", force=True)
+            return
+
+
+def _emit(name: str, value: Any, writer: _Writer):
+    if isinstance(value, Expense):
+        writer.add(f"{name}: " + " ".join(f"{key}={_format(item)}" for key, item in value._asdict().items()), force=True)
+    elif isinstance(value, dict):
+        scalars = " ".join(f"{key}={_format(item)}" for key, item in value.items() if _is_scalar(item))
+        if scalars:
+            writer.add(f"{name}: {scalars}", force=True)
+        for key, item in value.items():
+            if not _is_scalar(item):
+                _emit(f"{name}.{key}", item, writer)
+    elif isinstance(value, list):
+        if value and all(isinstance(item, (Expense, dict)) for item in value):
+            _table(name, value, writer)
+        else:
+            writer.add(f"{name}: " + ", ".join(_format(item) for item in value))
+    else:
+        writer.add(f"{name}: {_format(value)}", force=True)
+
+
+def compact(results: List, budget: int = SUMMARY_TOKEN_BUDGET) -> str:
+    """
+        Compact text form of tool results for the LLM: one line per scalar group, pipe separated
+        tables with categories numbered once, rounded amounts, truncated text and a hard token budget
+    """
+    results = results if isinstance(results, list) else [results]
+    remaining = budget * CHARS_PER_TOKEN
+    sections = [None] * len(results)
+    # smallest results first, each gets an equal share of what is left so one big table
+    # can't starve the others and unused space flows to the bigger ones
+    order = sorted(range(len(results)), key=lambda index: len(repr(results[index])))
+    for position, index in enumerate(order):
+        writer = _Writer(remaining // (len(results) - position))
+        _emit(f"#{index + 1}", results[index], writer)
+        remaining -= writer.size
+        sections[index] = writer.lines
+    return "\n".join(line for lines in sections for line in lines)
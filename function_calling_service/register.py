@@ -1,42 +1,125 @@
 from typing import Dict, Callable, Any, List
 from function_calling_service.models import Function
-from ollama import Client, ChatResponse
+from function_calling_service.router import ToolRouter, ROUTER_ENABLED
+from function_calling_service.schema import compile_arguments
+from function_calling_service.records import compact, to_json
+from ollama import ChatResponse
+from llm_service import llm_client, sessions, stages, structured
+from common.context import current_user, user_id
+from common.timing import span
+from common.log import get_logger
+from common.metrics import TOOL_SECONDS
+import asyncio
 import inspect
 import json
 import re
+import time
 from dotenv import load_dotenv
 from fastapi import Request
 import os
 
 load_dotenv()
 
+log = get_logger(__name__)
+
+# seconds each tool call may take before it is reported as an error
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", 15))
+# tool calls of one request running at the same time
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", 4))
+
+# render summaries from per tool templates when every called tool has one
+TEMPLATE_SUMMARY = os.getenv("TEMPLATE_SUMMARY", "true").lower() == "true"
+
+ROUTING_PROMPT = """You are a helpful financial assistant. Analyze the user's query and call the appropriate functions to retrieve the necessary information. Then, provide a concise summary of the results in Vietnamese."""
+# the summary is a single short field, the length cap keeps the 7b model from rambling
+SUMMARY_SCHEMA = {
+    "type": "object",
+    "properties": {"response": {"type": "string", "maxLength": 600}},
+    "required": ["response"],
+    "additionalProperties": False
+}
+# fixed so the summary prefix stays in the prompt cache of the sticky node, the query goes in the user message
+SUMMARY_PROMPT = """Bạn là một trợ lý tài chính hữu ích. Hãy tóm tắt ngắn gọn kết quả dựa trên câu hỏi của người dùng.
+
+Trả lời CHÍNH XÁC theo định dạng JSON sau, không thêm bất kỳ nội dung nào khác:
+
+"response": "Nội dung tóm tắt ở đây"
+
+Tin nhắn gồm câu hỏi và kết quả. Kết quả được gửi dạng bảng rút gọn: các cột ngăn cách bởi "|", hạng mục được đánh số ở dòng ".category".
+
+Lưu ý:
+- Tóm tắt bằng 1-3 câu ngắn gọn, không copy nguyên văn.
+- Phản hồi bằng tiếng Việt.
+- Chỉ trả về một đối tượng JSON duy nhất với một trường "response".
+- Đơn vị tiền tệ là VND"""
+SUMMARY_STREAM_PROMPT = """Bạn là một trợ lý tài chính hữu ích. Hãy tóm tắt ngắn gọn kết quả dựa trên câu hỏi của người dùng.
+
+Tin nhắn gồm câu hỏi và kết quả. Kết quả được gửi dạng bảng rút gọn: các cột ngăn cách bởi "|", hạng mục được đánh số ở dòng ".category".
+
+Lưu ý:
+- Tóm tắt bằng 1-3 câu ngắn gọn, không copy nguyên văn.
+- Phản hồi bằng tiếng Việt, chỉ trả về nội dung tóm tắt dạng văn bản thường.
+- Đơn vị tiền tệ là VND"""
+NO_FUNCTION_MESSAGE = "Xin lỗi, tôi không thể thực hiện chức năng này. Vui lòng thử lại hoặc thử tính năng khác"
+
+def summary_input(results: List, query: str) -> str:
+    return f"Câu hỏi: {query}\n\nKết quả:\n{compact(results)}"
+
 class FunctionRegistry:
     def __init__(self):
         self.functions: Dict[str, Function] = {}  # Initialize the dictionary
-        self.client = Client(host=f"{os.getenv('OLLAMA_HOST')}")
+        self.client = llm_client
+        self.sessions = sessions
+        self.router = ToolRouter(self.functions)
+        self._tools = None
     
-    def register(self, name: str, description: str, parameters: dict = None, required: List = []):
+    def register(self, name: str, description: str, parameters: dict = None, required: List = [],
+                 summarizer: Callable = None, examples: List[str] = [], intents: List[str] = []):
         """
-            Decorator to regiter function
+            Decorator to regiter function, summarizer renders the result without the LLM,
+            examples are sample queries that let the router skip the LLM and intents the
+            totals or superlatives the tool can answer
         """
         def decorator(func: Callable):
+            sig = inspect.signature(func)
             if parameters is None:
-                sig = inspect.signature(func)
                 params = {}
                 for param_name, param in sig.parameters.items():
                     param_type = param.annotation if param.annotation != inspect._empty else Any
                     params[param_name] = {"type": str(param_type).split("'")[1]}
 
-            self.functions[name] = Function(
+            self.functions[name] = self.compile(Function(
                 name=name,
                 description=description,
                 parameters=parameters or params,
                 function=func,  # Store the actual function.
-                required=required
-            )
+                required=required,
+                summarizer=summarizer,
+                examples=list(examples),
+                intents=list(intents)
+            ), sig)
+            self._tools = None
+            self.router.invalidate()
             return func
         return decorator
     
+    def compile(self, function: Function, sig: inspect.Signature) -> Function:
+        """
+            Precompute everything a call needs: the tool payload, whether to inject req and the argument coercer
+        """
+        function.tool = {
+            "type": "function",
+            "function": {
+                "name": function.name,
+                "description": function.description,
+                "parameters": function.parameters,
+                "required": function.required
+            }
+        }
+        function.needs_req = "req" in sig.parameters
+        function.coerce = compile_arguments(function.parameters, function.required, list(sig.parameters))
+        return function
+
     def get_function_info(self, function_name: str):
         if function_name in self.functions:
             return self.functions[function_name]
@@ -52,29 +135,35 @@ class FunctionRegistry:
         """
             List tools provide for AI
         """
-        descriptions = []
-        for func in self.functions.values():
-            desc = {
-                "type": "function",
-                "function": {
-                    "name": func.name,
-                    "description": func.description,
-                    "parameters": func.parameters,
-                    "required": func.required
-                }
-            }
-            descriptions.append(desc)
-        return descriptions
+        if self._tools is None:
+            self._tools = [func.tool for func in self.functions.values()]
+        return self._tools
     
-    def execute_function(self, name: str, parameters: dict) -> Any:
+    def warmup_prompt(self):
+        """
+            Same prefix as the tool selection call, for the warm-up
+        """
+        return stages.routing.models[0], [{"role": "system", "content": ROUTING_PROMPT}, {"role": "user", "content": "xin chào"}], {"tools": self.get_tools()}
+
+    async def execute_function(self, name: str, parameters: dict, req: Request = None) -> Any:
         """
             Excute function know name and parameter
         """
         if name not in self.functions:
             raise ValueError(f"Function {name} not found")
         
-        func = self.functions[name].function
-        return func(**parameters)
+        func = self.functions[name]
+        # invalid arguments fail here, before any backend I/O
+        arguments, fixes = func.coerce(parameters)
+        if fixes:
+            log.info("fixed arguments of %s: %s", name, fixes)
+        if func.needs_req:
+            arguments["req"] = req
+
+        result = await func.function(**arguments)
+        if fixes and isinstance(result, dict):
+            result = {**result, "fixed_arguments": fixes}
+        return result
 
     def extract_function_calls(self, llm_response: str) -> List[dict]:
         pattern = r'(\w+)\((.*?)\)'
@@ -91,7 +180,7 @@ class FunctionRegistry:
                         "parameters": params
                     })
                 except json.JSONDecodeError:
-                    print(f"Warning: Could not parse parameters for function {name}")
+                    log.warning("could not parse parameters for function %s", name)
                     continue
         return function_calls
     
@@ -114,86 +203,177 @@ class FunctionRegistry:
         
         return function_calls
 
-    def summarize_response(self, results: List, query: str, model: str = "qwen2.5:7b"):
-        print("GET SUMMARY !!!")
+    async def summarize_response(self, results: List, query: str, model: str = None):
         try:
             json_data = results if isinstance(results, list) else [results]
             
-            response = self.client.chat(
-                model=model,
+            summary = await stages.summary.run(
+                parse=lambda response: structured.parse(response.message.content, SUMMARY_SCHEMA)["response"],
+                confident=bool,
+                models=[model] if model else None,
                 messages=[
-                    {
-                        "role": "system",
-                        "content": f"""Bạn là một trợ lý tài chính hữu ích. Hãy tóm tắt ngắn gọn kết quả dựa trên câu hỏi của người dùng: {query}. 
-
-                        Trả lời CHÍNH XÁC theo định dạng JSON sau, không thêm bất kỳ nội dung nào khác:
-
-                        "response": "Nội dung tóm tắt ở đây"
-
-                        Lưu ý:
-                        - Tóm tắt bằng 1-3 câu ngắn gọn, không copy nguyên văn.
-                        - Phản hồi bằng tiếng Việt.
-                        - Chỉ trả về một đối tượng JSON duy nhất với một trường "response".
-                        - Đơn vị tiền tệ là VND
-                        """
-                    },
-                    {
-                        "role": "user",
-                        "content": str(results)
-                    }
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": summary_input(results, query)}
                 ],
-                format="json"
+                schema=SUMMARY_SCHEMA
             )
-            summary = json.loads(response.message.content)
-            return summary['response'] or "Xin lỗi bạn, tôi không thể thực hiện được yêu cầu của bạn"
+            return summary or "Xin lỗi bạn, tôi không thể thực hiện được yêu cầu của bạn"
         except Exception as e:
             return f"Lỗi khi tạo tóm tắt: {str(e)}"
 
-        
-    async def process_query(self, query: str, req: Request, model: str = "qwen2.5:7b") -> str:
-        print("ASK AI !!!")
-        system_prompt = """You are a helpful financial assistant. Analyze the user's query and call the appropriate functions to retrieve the necessary information. Then, provide a concise summary of the results in Vietnamese."""
-
-        response = self.client.chat(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": query}
-            ],
-            tools=self.get_tools()
-        )
-
-        function_calls = self.get_info(response)
+    async def summarize_response_stream(self, results: List, query: str, model: str = None):
+        """
+            Stream the summary as plain text chunks
+        """
+        try:
+            async for chunk in stages.summary.stream(
+                model=model,
+                messages=[
+                    {"role": "system", "content": SUMMARY_STREAM_PROMPT},
+                    {"role": "user", "content": summary_input(results, query)}
+                ]
+            ):
+                if chunk.message.content:
+                    yield chunk.message.content
+        except Exception as e:
+            yield f"Lỗi khi tạo tóm tắt: {str(e)}"
+
+    async def run_call(self, name: str, parameters: dict, req: Request, semaphore: asyncio.Semaphore, timeout: float = TOOL_TIMEOUT):
+        """
+            Execute one tool call, failures and timeouts are returned as {"error": ...}
+        """
+        async with semaphore:
+            log.debug("call %s %s", name, parameters)
+            outcome = "ok"
+            start = time.perf_counter()
+            try:
+                with span("tool", tool=name):
+                    return await asyncio.wait_for(self.execute_function(name, parameters, req), timeout)
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+                return {"error": f"Function {name} timed out after {timeout}s"}
+            except Exception as e:
+                outcome = "error"
+                log.warning("function %s failed: %r", name, e)
+                return {"error": str(e)}
+            finally:
+                TOOL_SECONDS.labels(name, outcome).observe(time.perf_counter() - start)
+
+    def function_name(self, name: str) -> str:
+        return name if name.startswith("function.") else "function." + name
+
+    def valid_calls(self, function_calls: List[dict]) -> bool:
+        """
+            The calls name known tools with usable arguments, otherwise a larger model gets the query
+        """
+        if not function_calls:
+            return False
+        for call in function_calls:
+            func = self.functions.get(self.function_name(call["name"]))
+            if func is None:
+                return False
+            try:
+                func.coerce(call["parameters"] or {})
+            except ValueError:
+                return False
+        return True
+
+    async def call_tools(self, query: str, req: Request, model: str = None, session=None):
+        """
+            Let the model pick the tools for the query and run them, earlier turns of the
+            session let it resolve follow ups. Returns (function names, results), None when no tool was picked
+        """
+        with span("router"):
+            function_calls = self.router.route(query) if ROUTER_ENABLED else None
+        if function_calls is None:
+            function_calls = await stages.routing.run(
+                parse=self.get_info,
+                confident=self.valid_calls,
+                models=[model] if model else None,
+                messages=[
+                    {"role": "system", "content": ROUTING_PROMPT},
+                    *self.sessions.history(session),
+                    {"role": "user", "content": query}
+                ],
+                tools=self.get_tools()
+            )
+
         if len(function_calls) == 0:
+            return None
+
+        calls = []
+        for call in function_calls:
+            func_name = self.function_name(call["name"])
+
+            if func_name in self.functions:
+                calls.append((func_name, call["parameters"] or {}))
+
+        semaphore = asyncio.Semaphore(TOOL_MAX_CONCURRENCY)
+        with span("tools"):
+            results = list(await asyncio.gather(*[self.run_call(name, params, req, semaphore) for name, params in calls]))
+        log.debug("results %s", results)
+        return [name for name, _ in calls], results
+
+    def template_summary(self, names: List[str], results: List):
+        """
+            Summary from the tools templates, None when a result needs the LLM
+        """
+        if not TEMPLATE_SUMMARY or not results:
+            return None
+
+        parts = []
+        for name, result in zip(names, results):
+            summarizer = self.functions[name].summarizer
+            if summarizer is None or "error" in result:
+                return None
+            try:
+                parts.append(summarizer(result))
+            except (KeyError, IndexError, TypeError, ValueError):
+                return None
+        return " ".join(parts)
+
+    async def process_query(self, query: str, req: Request, model: str = None) -> str:
+        session = self.sessions.get(user_id(current_user.get()), "ask")
+        called = await self.call_tools(query, req, model, session)
+        if called is None:
             return {
                 "query": query,
                 "results": [],
-                "summary": "Xin lỗi, tôi không thể thực hiện chức năng này. Vui lòng thử lại hoặc thử tính năng khác"
+                "summary": NO_FUNCTION_MESSAGE
             }
 
-        results = []
-        for call in function_calls:
-            func_name = call["name"]
-            if not func_name.startswith("function."):
-                func_name = "function." + func_name
-
-            if func_name in self.functions:
-                func_params = inspect.signature(self.functions[func_name].function).parameters
-                if "req" in func_params:
-                    call["parameters"]["req"] = req
-                try:
-                    print(func_name, call['parameters'])
-                    result = self.execute_function(func_name, call["parameters"])
-                    results.append(result)
-                except Exception as e:
-                    results.append({"error": str(e)})
-        print(results, "hehe")
-        summary = self.summarize_response(results, query)
+        names, results = called
+        summary = self.template_summary(names, results)
+        if summary is None:
+            summary = await self.summarize_response(results, query)
+        self.sessions.append(session, query, summary)
         return {
             "query": query,
-            "results": results,
+            "results": to_json(results),
             "summary": summary
         }
 
+    async def process_query_stream(self, query: str, req: Request, model: str = None):
+        """
+            Same as process_query but yields (event, data): tool results first, then the summary token by token
+        """
+        session = self.sessions.get(user_id(current_user.get()), "ask")
+        called = await self.call_tools(query, req, model, session)
+        if called is None:
+            yield "results", []
+            yield "summary", NO_FUNCTION_MESSAGE
+            yield "done", {"query": query, "results": [], "summary": NO_FUNCTION_MESSAGE}
+            return
 
-    
+        names, results = called
+        yield "results", to_json(results)
+        summary = self.template_summary(names, results)
+        if summary is not None:
+            yield "summary", summary
+        else:
+            summary = ""
+            async for chunk in self.summarize_response_stream(results, query):
+                summary += chunk
+                yield "summary", chunk
+        self.sessions.append(session, query, summary)
+        yield "done", {"query": query, "results": to_json(results), "summary": summary}
@@ -0,0 +1,175 @@
+from typing import Dict, List, Optional
+from sklearn.feature_extraction.text import TfidfVectorizer
+from function_calling_service.models import Function
+from common.vietnamese import fold, normalize, parse_amount, parse_date_range, match_category, match_type, type_hits
+from common.log import get_logger
+from dotenv import load_dotenv
+import numpy as np
+import re
+import os
+
+load_dotenv()
+
+log = get_logger(__name__)
+
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "true").lower() == "true"
+# cosine similarity the best tool needs, and how far ahead of the runner-up it has to be
+ROUTER_THRESHOLD = float(os.getenv("ROUTER_THRESHOLD", 0.7))
+ROUTER_MARGIN = float(os.getenv("ROUTER_MARGIN", 0.1))
+
+# how to fill each tool parameter from the query, keyed by parameter name
+EXTRACTORS = {
+    "amount": lambda query, dates: parse_amount(query),
+    "category": lambda query, dates: match_category(query),
+    "type": lambda query, dates: match_type(query),
+    "start": lambda query, dates: str(dates[0]) if dates else None,
+    "end": lambda query, dates: str(dates[1]) if dates else None,
+    "sinceBy": lambda query, dates: str(dates[0]) if dates else None,
+    "pageSize": lambda query, dates: parse_count(query),
+    "limit": lambda query, dates: parse_count(query),
+}
+
+# a value found in the query has to land in one of these parameters, otherwise the tool would silently ignore it
+CONSTRAINTS = {
+    "dates": ("start", "end", "sinceBy"),
+    "amount": ("amount",),
+    "category": ("category",),
+    "type": ("type",),
+    "count": ("pageSize", "limit"),
+}
+# totals and superlatives no parameter can express, only tools declaring the intent may answer them.
+# Matched on the folded query, "gần nhất"/"mới nhất" are not superlatives of the amount
+INTENTS = {
+    "total": re.compile(r"(?<!\w)(tong|bao nhieu)(?!\w)"),
+    "max": re.compile(r"(?<!\w)(lon|nhieu|cao|dat|nhieu tien) nhat(?!\w)"),
+    "min": re.compile(r"(?<!\w)(nho|it|thap|re|it tien) nhat(?!\w)"),
+}
+# "10 giao dịch gần nhất", "top 3 người"
+COUNT_PATTERN = re.compile(r"(?<!\w)(?:top\s+)?(\d{1,3})\s+(?:giao dich|khoan|nguoi|doi tac|lan)(?!\w)")
+# "chi tiêu", "cho tôi xem", "từ 1/3" say nothing about sent or received, typed with or without diacritics
+GENERIC_TYPE_WORDS = ["chi tiêu", "chi phí", "chi", "tiêu", "cho", "từ"]
+GENERIC_TYPE_PATTERN = re.compile(r"(?<!\w)(" + "|".join(sorted(
+    {re.escape(word) for word in GENERIC_TYPE_WORDS} | {re.escape(fold(word)) for word in GENERIC_TYPE_WORDS},
+    key=len, reverse=True
+)) + r")(?!\w)")
+
+def parse_count(query: str) -> Optional[int]:
+    match = COUNT_PATTERN.search(fold(query))
+    return int(match[1]) if match else None
+
+def query_intents(query: str) -> List[str]:
+    folded = fold(query)
+    return [name for name, pattern in INTENTS.items() if pattern.search(folded)]
+
+def query_type(query: str) -> Optional[str]:
+    """
+        Sent or received when the query asks for one of them, None for generic spending words or both
+    """
+    if len(set(type_hits(query))) > 1:
+        return None
+    types = set(type_hits(GENERIC_TYPE_PATTERN.sub(" ", normalize(query))))
+    return types.pop() if len(types) == 1 else None
+
+def constraints(query: str, dates) -> Dict[str, object]:
+    found = {
+        "dates": dates,
+        "amount": parse_amount(query),
+        "category": match_category(query),
+        "type": query_type(query),
+        "count": parse_count(query),
+    }
+    return {name: value for name, value in found.items() if value is not None}
+
+class ToolRouter:
+    def __init__(self, functions: Dict[str, Function]):
+        """
+            Local router matching queries to tools with a char n-gram TF-IDF index over
+            the tool descriptions and example queries
+        """
+        self.functions = functions
+        self.vectorizer = None
+        self.matrix = None
+        self.labels = None
+
+    def invalidate(self):
+        self.vectorizer = None
+
+    def fit(self):
+        texts, labels = [], []
+        for func in self.functions.values():
+            for example in [func.description, *func.examples]:
+                texts.append(fold(example))
+                labels.append(func.name)
+
+        # char n-grams cope with typos and queries typed without diacritics
+        self.vectorizer = TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 4), sublinear_tf=True)
+        self.matrix = self.vectorizer.fit_transform(texts)
+        self.labels = np.array(labels)
+
+    def classify(self, query: str):
+        """
+            Returns (best tool name, score, margin over the second best tool)
+        """
+        if self.vectorizer is None:
+            self.fit()
+
+        similarities = (self.matrix @ self.vectorizer.transform([fold(query)]).T).toarray().ravel()
+        scores = {}
+        for label, similarity in zip(self.labels, similarities):
+            scores[label] = max(scores.get(label, 0.0), similarity)
+        ranked = sorted(scores.items(), key=lambda item: -item[1])
+        best, score = ranked[0]
+        second = ranked[1][1] if len(ranked) > 1 else 0.0
+        return str(best), float(score), float(score - second)
+
+    def extract_arguments(self, query: str, func: Function) -> Optional[dict]:
+        """
+            Arguments for the tool, None when a required one can't be found in the query, the query
+            has a date, amount, category, type or count the tool has no parameter for, or asks for a
+            total or superlative the tool does not answer
+        """
+        dates = parse_date_range(query)
+        properties = func.parameters.get("properties", {})
+        for name, value in constraints(query, dates).items():
+            if not any(param in properties for param in CONSTRAINTS[name]):
+                log.debug("not routed to %s, it can not take %s=%s", func.name, name, value)
+                return None
+        for intent in query_intents(query):
+            if intent not in func.intents:
+                log.debug("not routed to %s, it does not answer %s", func.name, intent)
+                return None
+
+        arguments = {}
+        for name in func.parameters.get("properties", {}):
+            if name in EXTRACTORS:
+                value = EXTRACTORS[name](query, dates)
+                if value is None:
+                    continue
+                # "50 giao dịch" would be cut to the page maximum without saying so
+                maximum = properties[name].get("maximum")
+                if isinstance(value, int) and maximum is not None and value > maximum:
+                    log.debug("not routed to %s, %s=%s is over %s", func.name, name, value, maximum)
+                    return None
+                arguments[name] = value
+
+        if any(name not in arguments for name in func.required):
+            return None
+        return arguments
+
+    def route(self, query: str) -> Optional[List[dict]]:
+        """
+            Tool calls for high confidence queries, None to let the LLM decide
+        """
+        if not self.functions:
+            return None
+
+        name, score, margin = self.classify(query)
+        if score < ROUTER_THRESHOLD or margin < ROUTER_MARGIN:
+            return None
+
+        arguments = self.extract_arguments(query, self.functions[name])
+        if arguments is None:
+            return None
+
+        log.debug("routed %s score=%.2f margin=%.2f", name, score, margin)
+        return [{"name": name, "parameters": arguments}]
@@ -0,0 +1,150 @@
+from typing import Callable, Dict, List, Tuple
+from datetime import date
+import math
+from common.vietnamese import CATEGORIES, TYPES, normalize, fold, parse_amount, parse_date, parse_date_range, match_category, match_type
+
+# Every converter returns (value, repaired). repaired is True when the value had to be
+# reinterpreted, e.g. "50k" -> 50000 or "tháng này" -> "2025-05-01", not for plain casts like "2" -> 2
+
+def _finite(number: float) -> float:
+    # "nan", "inf" and "1e400" parse as floats but are no amount or page, int(inf) would raise OverflowError
+    if not math.isfinite(number):
+        raise ValueError
+    return number
+
+def _number(value, name: str):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return _finite(float(value)), False
+    text = str(value).strip()
+    try:
+        return _finite(float(text)), False
+    except ValueError:
+        pass
+    # Vietnamese shorthand: 50k, 1tr, 1tr2, 1b, 100.000đ
+    amount = parse_amount(text)
+    if amount is None:
+        raise ValueError
+    return amount, True
+
+def _integer(value, name: str):
+    number, repaired = _number(value, name)
+    if not number.is_integer():
+        return int(round(number)), True
+    return int(number), repaired
+
+def _date(value, name: str):
+    if isinstance(value, date):
+        return value.isoformat(), False
+    text = str(value).strip()
+    try:
+        return date.fromisoformat(text).isoformat(), False
+    except ValueError:
+        pass
+    parsed = parse_date(text)
+    if parsed is not None:
+        return parsed.isoformat(), True
+    # phrases such as "tháng này", the end of a range takes the last day
+    dates = parse_date_range(text)
+    if dates is None:
+        raise ValueError
+    return (dates[1] if name == "end" else dates[0]).isoformat(), True
+
+def _string(value, name: str):
+    return str(value).strip(), False
+
+def _boolean(value, name: str):
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "1", "yes", "có"), False
+    return bool(value), False
+
+# declared JSON schema types (the tools also use python names) -> converter
+CONVERTERS = {
+    "int": _integer,
+    "integer": _integer,
+    "float": _number,
+    "number": _number,
+    "string": _string,
+    "str": _string,
+    "date": _date,
+    "bool": _boolean,
+    "boolean": _boolean,
+}
+
+def _enum_matcher(values: List[str]) -> Callable:
+    """
+        Map a free form value onto one of the allowed values, None when impossible
+    """
+    by_fold = {fold(value): value for value in values}
+    if set(values) <= set(CATEGORIES):
+        keyword = match_category
+    elif set(values) <= set(TYPES):
+        # "chi" -> "gửi", "thu" -> "nhận"
+        keyword = match_type
+    else:
+        keyword = lambda text: None
+
+    def match(value: str):
+        if value in values:
+            return value
+        found = by_fold.get(fold(value)) or keyword(normalize(value))
+        return found if found in values else None
+    return match
+
+def properties_of(parameters: dict) -> dict:
+    # parameters inferred from the signature are a flat {name: {"type": ...}}
+    return parameters.get("properties", parameters) if parameters else {}
+
+def compile_arguments(parameters: dict, required: List[str], accepted: List[str]) -> Callable[[Dict], Tuple[Dict, Dict]]:
+    """
+        Build the argument validator of a tool from its JSON schema. It converts to the declared type
+        (including Vietnamese amounts and dates), maps enums, clamps to minimum/maximum, fills defaults
+        and drops arguments the function does not take.
+        Returns (arguments, fixes) where fixes is {name: {"from": ..., "to": ...}} for every repaired field.
+        Raises ValueError on arguments that can't be repaired
+    """
+    fields = []
+    for name, spec in properties_of(parameters).items():
+        if name == "req" or name not in accepted:
+            continue
+        convert = CONVERTERS.get(spec.get("type"))
+        enum = _enum_matcher(spec["enum"]) if spec.get("enum") else None
+        # "minium" is a typo used by some of the registered schemas
+        minimum = spec.get("minimum", spec.get("minium"))
+        maximum = spec.get("maximum")
+        fields.append((name, convert, enum, minimum, maximum, "default" in spec, spec.get("default"), name in required))
+
+    def coerce(arguments: Dict) -> Tuple[Dict, Dict]:
+        result = {}
+        fixes = {}
+        for name, convert, enum, minimum, maximum, has_default, default, is_required in fields:
+            original = arguments.get(name)
+            if original is None or original == "":
+                if is_required:
+                    raise ValueError(f"Missing required argument '{name}'")
+                if has_default:
+                    result[name] = default
+                continue
+
+            value, repaired = original, False
+            if convert is not None:
+                try:
+                    value, repaired = convert(original, name)
+                except (TypeError, ValueError):
+                    raise ValueError(f"Argument '{name}' has invalid value {original!r}")
+            if enum is not None:
+                matched = enum(str(value))
+                if matched is None:
+                    raise ValueError(f"Argument '{name}' has invalid value {original!r}")
+                repaired = repaired or matched != value
+                value = matched
+            if minimum is not None and value < minimum:
+                value, repaired = minimum, True
+            if maximum is not None and value > maximum:
+                value, repaired = maximum, True
+
+            if repaired:
+                fixes[name] = {"from": original, "to": value}
+            result[name] = value
+        return result, fixes
+
+    return coerce
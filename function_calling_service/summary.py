@@ -0,0 +1,54 @@
+def format_vnd(amount) -> str:
+    return f"{round(float(amount)):,}".replace(",", ".") + " VND"
+
+def expense_list(result: dict) -> str:
+    """
+        Summary for tools returning one page {"expenses": [Expense, ...], "total_count": n}, the page
+        is not the user's whole history so nothing here is presented as a total
+    """
+    expenses = result["expenses"]
+    if not expenses:
+        return "Không tìm thấy giao dịch nào phù hợp."
+
+    biggest = max(expenses, key=lambda expense: float(expense.amount))
+    categories = {expense.category for expense in expenses}
+
+    summary = f"Đây là {len(expenses)} giao dịch được trả về, chưa phải toàn bộ lịch sử của bạn."
+    summary += f" Khoản lớn nhất trong số này là {format_vnd(biggest.amount)} ({biggest.category}): {biggest.description}."
+    if len(categories) == 1:
+        summary += f" Tất cả thuộc hạng mục {biggest.category}."
+    return summary
+
+def single_expense(label: str):
+    """
+        Summary for tools returning one expense, label is e.g. "lớn nhất"
+    """
+    def summarize(result: dict) -> str:
+        expense = result["expenses"]
+        return f"Giao dịch {label} của bạn là {format_vnd(expense.amount)} thuộc hạng mục {expense.category}: {expense.description}."
+    return summarize
+
+def top_partner(result: dict) -> str:
+    partner = result["partner"]
+    return f"Bạn giao dịch nhiều nhất với {partner['name']}: {partner['transaction_count']} giao dịch, tổng cộng {format_vnd(partner['total_amount'])}."
+
+def totals(by: str, label: str, limit: int = 5):
+    """
+        Summary for aggregation tools returning {"totals": [{by, "total_amount", "transaction_count"}], ...}
+    """
+    def summarize(result: dict) -> str:
+        if not result["totals"]:
+            return "Không tìm thấy giao dịch nào phù hợp."
+        parts = [f"{item[by]}: {format_vnd(item['total_amount'])}" for item in result["totals"][:limit]]
+        more = f" và {len(result['totals']) - limit} mục khác" if len(result["totals"]) > limit else ""
+        undated = f" {result['undated_count']} giao dịch không có ngày không được tính." if result.get("undated_count") else ""
+        return (f"Tổng cộng {format_vnd(result['total_amount'])} qua {result['transaction_count']} giao dịch. "
+                f"{label}: {', '.join(parts)}{more}.{undated}")
+    return summarize
+
+def top_partners(result: dict) -> str:
+    partners = result["partners"]
+    if not partners:
+        return "Bạn chưa có giao dịch với ai."
+    parts = [f"{p['name']} ({p['transaction_count']} giao dịch, {format_vnd(p['total_amount'])})" for p in partners]
+    return f"Những người bạn giao dịch nhiều nhất: {', '.join(parts)}."
@@ -0,0 +1,10 @@
+from llm_service.client import LLMClient, llm_client
+from llm_service.cache import ResponseCache, llm_cache
+from llm_service.pool import OllamaPool
+from llm_service.scheduler import InferenceScheduler, Priority, SchedulerRejected
+from llm_service import stages, structured
+from llm_service.stages import ModelUnavailable
+from llm_service.session import SessionStore, sessions
+from llm_service.warmup import Warmup, warmup
+
+__all__ = ["LLMClient", "llm_client", "ResponseCache", "llm_cache", "OllamaPool", "InferenceScheduler", "Priority", "SchedulerRejected", "ModelUnavailable", "stages", "structured", "SessionStore", "sessions", "Warmup", "warmup"]
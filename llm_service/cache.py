@@ -0,0 +1,130 @@
+from typing import Optional
+from cachetools import TTLCache
+from dotenv import load_dotenv
+from common.vietnamese import normalize
+import functools
+import threading
+import asyncio
+import hashlib
+import sqlite3
+import time
+import os
+
+load_dotenv()
+
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "memory")  # memory, sqlite or off
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 24 * 60 * 60))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", 10000))
+
+
+@functools.lru_cache(maxsize=128)
+def prompt_hash(system_prompt: str) -> str:
+    return hashlib.sha256(system_prompt.encode()).hexdigest()
+
+
+class MemoryBackend:
+    def __init__(self, size: int, ttl: float):
+        self.cache = TTLCache(maxsize=size, ttl=ttl)
+
+    def get(self, key: str) -> Optional[str]:
+        return self.cache.get(key)
+
+    def set(self, key: str, value: str):
+        self.cache[key] = value
+
+
+class SQLiteBackend:
+    def __init__(self, path: str, size: int, ttl: float):
+        """
+            On disk store so a warm cache survives worker restarts
+        """
+        self.size = size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires REAL, used REAL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS cache_used ON cache (used)")
+        self.db.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self.db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self.db.commit()
+                return None
+            self.db.execute("UPDATE cache SET used = ? WHERE key = ?", (now, key))
+            self.db.commit()
+            return row[0]
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)", (key, value, now + self.ttl, now))
+            # least recently used rows go first
+            self.db.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                (self.size,)
+            )
+            self.db.commit()
+
+
+class ResponseCache:
+    def __init__(self, backend=None):
+        """
+            Cache of LLM outputs keyed by model, system prompt and normalized query.
+            Only for stages whose output does not depend on live user data
+        """
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model: str, system_prompt: str, query: str) -> str:
+        return hashlib.sha256(f"{model}\0{prompt_hash(system_prompt)}\0{normalize(query)}".encode()).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        if self.backend is None:
+            return None
+        if isinstance(self.backend, SQLiteBackend):
+            value = await asyncio.to_thread(self.backend.get, key)
+        else:
+            value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str):
+        if self.backend is None:
+            return
+        if isinstance(self.backend, SQLiteBackend):
+            await asyncio.to_thread(self.backend.set, key, value)
+        else:
+            self.backend.set(key, value)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": LLM_CACHE_BACKEND,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+def make_backend(name: str = LLM_CACHE_BACKEND):
+    if name == "memory":
+        return MemoryBackend(LLM_CACHE_SIZE, LLM_CACHE_TTL)
+    if name == "sqlite":
+        return SQLiteBackend(LLM_CACHE_PATH, LLM_CACHE_SIZE, LLM_CACHE_TTL)
+    return None
+
+
+llm_cache = ResponseCache(make_backend())
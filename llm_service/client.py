@@ -0,0 +1,55 @@
+from ollama import ChatResponse
+from dotenv import load_dotenv
+from llm_service.scheduler import InferenceScheduler, Priority
+from llm_service.pool import OllamaPool
+from common.context import current_user, user_id
+import os
+
+load_dotenv()
+
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+# comma separated list of Ollama nodes, falls back to OLLAMA_HOST
+OLLAMA_HOSTS = [host.strip() for host in os.getenv("OLLAMA_HOSTS", OLLAMA_HOST).split(",") if host.strip()]
+# seconds, a generation on CPU can take a while so read timeout is generous
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", 120))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", 5))
+# number of generations allowed in flight at the same time on each node
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", 4))
+# how long Ollama keeps a model and its prompt cache loaded after a request
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+
+class LLMClient:
+    def __init__(self, hosts: list = OLLAMA_HOSTS, timeout: float = OLLAMA_TIMEOUT,
+                 connect_timeout: float = OLLAMA_CONNECT_TIMEOUT, max_concurrency: int = OLLAMA_MAX_CONCURRENCY):
+        """
+            One pool of Ollama nodes shared by /ask and /chat
+        """
+        self.pool = OllamaPool(hosts, timeout, connect_timeout, max_concurrency)
+        self.scheduler = InferenceScheduler(max_concurrency=max_concurrency * len(self.pool.nodes))
+
+    async def chat(self, priority: int = Priority.CHAT, **kwargs) -> ChatResponse:
+        """
+            Run a non streaming chat, waiting for a free slot first
+        """
+        kwargs.setdefault("keep_alive", OLLAMA_KEEP_ALIVE)
+        async with self.scheduler.slot(priority):
+            return await self.pool.chat(session=user_id(current_user.get()), **kwargs)
+
+    async def chat_stream(self, priority: int = Priority.CHAT, **kwargs):
+        """
+            Run a streaming chat and yield the chunks, the slot is held until the stream ends
+        """
+        kwargs.setdefault("keep_alive", OLLAMA_KEEP_ALIVE)
+        async with self.scheduler.slot(priority):
+            async for chunk in self.pool.chat_stream(session=user_id(current_user.get()), **kwargs):
+                yield chunk
+
+    def start(self):
+        self.pool.start()
+
+    async def aclose(self):
+        await self.pool.aclose()
+
+
+llm_client = LLMClient()
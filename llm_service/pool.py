@@ -0,0 +1,260 @@
+from ollama import AsyncClient, ChatResponse, ResponseError
+from cachetools import TTLCache
+from collections import deque
+from dotenv import load_dotenv
+from typing import List
+from common.log import get_logger
+from common.metrics import OLLAMA_ERRORS, ollama_counts, observe_ollama
+from common.timing import span
+import asyncio
+import httpx
+import time
+import os
+
+load_dotenv()
+
+log = get_logger(__name__)
+
+# consecutive failures before a node is taken out of rotation
+OLLAMA_EJECT_AFTER = int(os.getenv("OLLAMA_EJECT_AFTER", 3))
+# seconds an ejected node stays out before it gets traffic again
+OLLAMA_EJECT_SECONDS = float(os.getenv("OLLAMA_EJECT_SECONDS", 30))
+# seconds between background health probes, 0 to disable
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", 10))
+# seconds a user stays pinned to the node that served them last
+OLLAMA_STICKY_TTL = float(os.getenv("OLLAMA_STICKY_TTL", 600))
+# leave the sticky node once it has this many more generations in flight than the least loaded one
+OLLAMA_STICKY_SLACK = int(os.getenv("OLLAMA_STICKY_SLACK", 2))
+
+
+def node_error(error: Exception) -> bool:
+    """
+        The node itself is at fault, not the request
+    """
+    if isinstance(error, ResponseError):
+        return error.status_code >= 500
+    return isinstance(error, (httpx.TransportError, ConnectionError))
+
+
+def retryable(error: Exception) -> bool:
+    """
+        Nothing was generated yet, another node can take the request
+    """
+    if isinstance(error, ResponseError):
+        return error.status_code == 503
+    return isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, ConnectionError))
+
+
+class Node:
+    def __init__(self, host: str, timeout: float, connect_timeout: float, max_concurrency: int):
+        self.host = host
+        # owned here so aclose() can close it, AsyncClient has no public way to
+        self.transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        )
+        self.client = AsyncClient(
+            host=host,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            transport=self.transport
+        )
+        # health probes have their own connection, they must not queue behind generations holding the pool
+        self.probe_client = httpx.AsyncClient(base_url=host, timeout=connect_timeout)
+        self.connect_timeout = connect_timeout
+        self.in_flight = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        # back from an outage but not warmed yet, kept out of rotation until restore()
+        self.warming = False
+        self.requests = 0
+        self.errors = 0
+        # moving average of a whole generation, seconds
+        self.latency = 0.0
+        self.latencies = deque(maxlen=500)
+
+    @property
+    def healthy(self) -> bool:
+        return not self.warming and time.monotonic() >= self.ejected_until
+
+    def load(self):
+        return (self.in_flight, self.latency)
+
+    def succeeded(self, elapsed: float):
+        self.requests += 1
+        self.failures = 0
+        self.latency = elapsed if not self.latencies else 0.8 * self.latency + 0.2 * elapsed
+        self.latencies.append(elapsed)
+
+    def failed(self, error: Exception):
+        self.requests += 1
+        if not node_error(error):
+            return
+        self.errors += 1
+        self.failures += 1
+        OLLAMA_ERRORS.labels(self.host).inc()
+        if self.failures >= OLLAMA_EJECT_AFTER:
+            self.eject(error)
+
+    def eject(self, error: Exception):
+        if self.healthy:
+            log.warning("eject %s: %r", self.host, error)
+        self.ejected_until = time.monotonic() + OLLAMA_EJECT_SECONDS
+
+    async def probe(self) -> bool:
+        """
+            Returns True when an ejected node answers again, it stays out until restore()
+        """
+        try:
+            response = await self.probe_client.get("/api/version")
+            response.raise_for_status()
+        except Exception as e:
+            self.errors += 1
+            self.failures = max(self.failures, OLLAMA_EJECT_AFTER)
+            self.eject(e)
+            return False
+        if self.healthy:
+            self.failures = 0
+            return False
+        return True
+
+    async def aclose(self):
+        await self.probe_client.aclose()
+        await self.transport.aclose()
+
+    def restore(self):
+        if not self.healthy:
+            log.info("restore %s", self.host)
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.warming = False
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            "host": self.host,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_avg": self.latency,
+            "latency_p50": latencies[len(latencies) // 2] if latencies else 0.0,
+            "latency_p95": latencies[int(len(latencies) * 0.95)] if latencies else 0.0
+        }
+
+
+class OllamaPool:
+    def __init__(self, hosts: List[str], timeout: float, connect_timeout: float, max_concurrency: int):
+        """
+            Several Ollama nodes behind one chat interface, least loaded healthy node first
+            and users kept on the same node so its prompt cache stays warm
+        """
+        self.nodes = [Node(host, timeout, connect_timeout, max_concurrency) for host in hosts]
+        self.sessions = TTLCache(maxsize=100000, ttl=OLLAMA_STICKY_TTL)
+        self.health_task = None
+        # async callback warming a node that answers again, True when it may take traffic
+        self.on_restore = None
+        self.restoring = set()
+
+    def pick(self, session: str = None, exclude: List[Node] = ()) -> Node:
+        candidates = [node for node in self.nodes if node not in exclude]
+        # when everything is ejected try the node that has been out the longest
+        healthy = [node for node in candidates if node.healthy] or [min(candidates, key=lambda node: node.ejected_until)]
+        best = min(healthy, key=Node.load)
+        if session is not None:
+            sticky = self.sessions.get(session)
+            if sticky in healthy and sticky.in_flight - best.in_flight < OLLAMA_STICKY_SLACK:
+                best = sticky
+            self.sessions[session] = best
+        return best
+
+    async def chat(self, session: str = None, **kwargs) -> ChatResponse:
+        tried = []
+        while True:
+            node = self.pick(session, tried)
+            node.in_flight += 1
+            start = time.monotonic()
+            try:
+                with span("ollama", host=node.host, model=kwargs.get("model")) as attributes:
+                    response = await node.client.chat(**kwargs)
+                    attributes.update(ollama_counts(response))
+                observe_ollama(kwargs.get("model"), ollama_counts(response))
+            except Exception as e:
+                node.failed(e)
+                tried.append(node)
+                if not retryable(e) or len(tried) == len(self.nodes):
+                    raise
+                continue
+            finally:
+                node.in_flight -= 1
+            node.succeeded(time.monotonic() - start)
+            return response
+
+    async def chat_stream(self, session: str = None, **kwargs):
+        """
+            Stream from one node, fail over only while nothing has been yielded yet
+        """
+        tried = []
+        while True:
+            node = self.pick(session, tried)
+            node.in_flight += 1
+            start = time.monotonic()
+            started = False
+            try:
+                counts = {}
+                with span("ollama", host=node.host, model=kwargs.get("model"), stream=True) as attributes:
+                    async for chunk in await node.client.chat(stream=True, **kwargs):
+                        started = True
+                        # only the last chunk carries the counts
+                        counts = ollama_counts(chunk) or counts
+                        yield chunk
+                    attributes.update(counts)
+                observe_ollama(kwargs.get("model"), counts)
+                node.succeeded(time.monotonic() - start)
+                return
+            except Exception as e:
+                node.failed(e)
+                tried.append(node)
+                if started or not retryable(e) or len(tried) == len(self.nodes):
+                    raise
+            finally:
+                node.in_flight -= 1
+
+    async def rejoin(self, node: Node) -> bool:
+        """
+            Keep the node out of rotation while on_restore runs and put it back only when that succeeds,
+            a failed warm-up leaves it ejected for the next probe to try again
+        """
+        node.warming = True
+        try:
+            ok = self.on_restore is None or await self.on_restore(node)
+        finally:
+            node.warming = False
+        if ok:
+            node.restore()
+        return ok
+
+    async def health_loop(self, interval: float):
+        while True:
+            # nodes being warmed are left alone, their warm-up decides when they come back
+            nodes = [node for node in self.nodes if not node.warming]
+            answered = await asyncio.gather(*(node.probe() for node in nodes))
+            for node, back in zip(nodes, answered):
+                # a warm-up may have started while the probe was in flight
+                if back and not node.warming:
+                    # a slow warm-up must not hold up the probes of the other nodes
+                    task = asyncio.create_task(self.rejoin(node))
+                    self.restoring.add(task)
+                    task.add_done_callback(self.restoring.discard)
+            await asyncio.sleep(interval)
+
+    def start(self, interval: float = OLLAMA_HEALTH_INTERVAL):
+        if interval > 0 and self.health_task is None:
+            self.health_task = asyncio.create_task(self.health_loop(interval))
+
+    def stats(self) -> List[dict]:
+        return [node.stats() for node in self.nodes]
+
+    async def aclose(self):
+        if self.health_task is not None:
+            self.health_task.cancel()
+            self.health_task = None
+        await asyncio.gather(*(node.aclose() for node in self.nodes))
@@ -0,0 +1,173 @@
+from contextlib import asynccontextmanager
+from collections import Counter, deque
+from enum import IntEnum
+from dotenv import load_dotenv
+from common.context import current_user, user_id
+from common.timing import span
+from common.metrics import SCHEDULER_REJECTED
+import asyncio
+import heapq
+import itertools
+import math
+import time
+import os
+
+load_dotenv()
+
+# generations in flight, OLLAMA_MAX_CONCURRENCY is kept as the name of the limit
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", 4))
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", 64))
+# queued + running generations one user may have
+LLM_MAX_PER_USER = int(os.getenv("LLM_MAX_PER_USER", 4))
+# seconds a request may wait in the queue before it is dropped
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 30))
+# reject right away when the estimated wait is longer than this (seconds)
+LLM_WAIT_BUDGET = float(os.getenv("LLM_WAIT_BUDGET", 20))
+
+
+class Priority(IntEnum):
+    ROUTING = 0
+    CHAT = 1
+    SUMMARY = 2
+    BACKGROUND = 3
+
+
+class SchedulerRejected(Exception):
+    def __init__(self, message: str, status_code: int, retry_after: float = 1):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class InferenceScheduler:
+    def __init__(self, max_concurrency: int = OLLAMA_MAX_CONCURRENCY, max_queue: int = LLM_QUEUE_SIZE,
+                 max_per_user: int = LLM_MAX_PER_USER, queue_timeout: float = LLM_QUEUE_TIMEOUT,
+                 wait_budget: float = LLM_WAIT_BUDGET):
+        """
+            Admission control in front of Ollama: bounded priority queue, per user limit,
+            queue deadlines and early rejection when the estimated wait is over budget
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self.queue_timeout = queue_timeout
+        self.wait_budget = wait_budget
+
+        self.running = 0
+        self.queue = []  # heap of (priority, seq, future)
+        self.queued = 0
+        self.seq = itertools.count()
+        self.per_user = Counter()
+        # moving average of how long a generation holds its slot, seconds
+        self.service_time = 2.0
+
+        self.admitted = 0
+        self.rejected = Counter()
+        self.waits = deque(maxlen=1000)
+
+    def estimated_wait(self, priority: int) -> float:
+        if self.running < self.max_concurrency and not self.queued:
+            return 0.0
+        ahead = sum(1 for item in self.queue if item[0] <= priority and not item[2].done())
+        return math.ceil((ahead + 1) / self.max_concurrency) * self.service_time
+
+    def reject(self, reason: str, message: str, status_code: int, retry_after: float):
+        self.rejected[reason] += 1
+        SCHEDULER_REJECTED.labels(reason).inc()
+        raise SchedulerRejected(message, status_code, retry_after)
+
+    async def acquire(self, priority: int, user: str = None):
+        if user is not None and self.per_user[user] >= self.max_per_user:
+            self.reject("user_limit", "Too many requests in progress, please wait", 429, self.service_time)
+
+        if self.running < self.max_concurrency and not self.queued:
+            self.running += 1
+        else:
+            if self.queued >= self.max_queue:
+                self.reject("queue_full", "Server is busy, please try again later", 503, self.service_time)
+            estimate = self.estimated_wait(priority)
+            if estimate > self.wait_budget:
+                self.reject("over_budget", "Server is busy, please try again later", 503, estimate)
+            # queued requests count towards the user's limit too
+            self.per_user[user] += 1
+            try:
+                with span("queue"):
+                    await self.wait_turn(priority)
+            finally:
+                self.forget(user)
+        self.per_user[user] += 1
+        self.admitted += 1
+
+    def forget(self, user: str = None):
+        self.per_user[user] -= 1
+        if self.per_user[user] <= 0:
+            del self.per_user[user]
+
+    async def wait_turn(self, priority: int):
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.queue, (priority, next(self.seq), waiter))
+        self.queued += 1
+        start = time.monotonic()
+        try:
+            await asyncio.wait({waiter}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            self.leave(waiter)
+            raise
+        self.waits.append(time.monotonic() - start)
+        if not waiter.done():
+            self.leave(waiter)
+            self.reject("queue_timeout", "Request timed out in queue", 503, self.service_time)
+
+    def leave(self, waiter: asyncio.Future):
+        """
+            Waiter gave up, hand the slot on if it was granted meanwhile
+        """
+        if waiter.done():
+            self.release_slot()
+        else:
+            waiter.cancel()
+            self.queued -= 1
+
+    def release_slot(self):
+        while self.queue:
+            _, _, waiter = heapq.heappop(self.queue)
+            if not waiter.done():
+                # the slot goes straight to the next waiter, running stays the same
+                self.queued -= 1
+                waiter.set_result(None)
+                return
+        self.running -= 1
+
+    def release(self, user: str = None, held: float = None):
+        self.forget(user)
+        if held is not None:
+            self.service_time = 0.8 * self.service_time + 0.2 * held
+        self.release_slot()
+
+    @asynccontextmanager
+    async def slot(self, priority: int = Priority.CHAT, user: str = None):
+        """
+            Hold one generation slot, user defaults to the JWT user of the current request
+        """
+        if user is None:
+            user = user_id(current_user.get())
+        await self.acquire(priority, user)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(user, time.monotonic() - start)
+
+    def stats(self) -> dict:
+        waits = sorted(self.waits)
+        return {
+            "running": self.running,
+            "capacity": self.max_concurrency,
+            "queue_depth": self.queued,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "service_time": self.service_time,
+            "wait_avg": sum(waits) / len(waits) if waits else 0.0,
+            "wait_p95": waits[int(len(waits) * 0.95)] if waits else 0.0,
+            "wait_max": waits[-1] if waits else 0.0
+        }
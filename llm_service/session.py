@@ -0,0 +1,135 @@
+from cachetools import TTLCache
+from dataclasses import dataclass, field
+from dotenv import load_dotenv
+from typing import List, Optional
+from llm_service import stages
+from common.log import get_logger
+import asyncio
+import os
+
+load_dotenv()
+
+log = get_logger(__name__)
+
+# seconds of inactivity before a conversation is forgotten
+SESSION_TTL = float(os.getenv("SESSION_TTL", 1800))
+SESSION_MAX_USERS = int(os.getenv("SESSION_MAX_USERS", 10000))
+# estimated tokens of history kept verbatim before the oldest turns are summarized
+SESSION_TOKEN_BUDGET = int(os.getenv("SESSION_TOKEN_BUDGET", 1500))
+# hard cap on user/assistant pairs kept verbatim
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", 10))
+# rough size of a token for Vietnamese text
+CHARS_PER_TOKEN = 3
+
+SUMMARY_PROMPT = """Tóm tắt ngắn gọn cuộc trò chuyện sau giữa người dùng và trợ lý tài chính bằng tiếng Việt, dưới 100 từ.
+Giữ lại các số tiền, hạng mục, ngày tháng và đối tác đã được nhắc tới. Chỉ trả về bản tóm tắt."""
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+@dataclass
+class Session:
+    summary: str = ""
+    turns: List[dict] = field(default_factory=list)
+    tokens: int = 0
+    compacting: bool = False
+
+    @property
+    def empty(self) -> bool:
+        return not self.turns and not self.summary
+
+
+class SessionStore:
+    def __init__(self, max_users: int = SESSION_MAX_USERS, ttl: float = SESSION_TTL,
+                 token_budget: int = SESSION_TOKEN_BUDGET, max_turns: int = SESSION_MAX_TURNS):
+        """
+            Conversation history per user, append only between compactions so the prompt
+            prefix (system prompt, summary, earlier turns) stays identical and Ollama can reuse it
+        """
+        self.sessions = TTLCache(maxsize=max_users, ttl=ttl)
+        self.token_budget = token_budget
+        self.max_turns = max_turns
+        self.stage = stages.memory
+        self.tasks = set()
+
+    def get(self, *key) -> Optional[Session]:
+        """
+            key starts with the user id, no user means no memory
+        """
+        if key[0] is None:
+            return None
+        session = self.sessions.get(key)
+        if session is None:
+            session = Session()
+        # re-inserting restarts the idle timer
+        self.sessions[key] = session
+        return session
+
+    def reset(self, user: str) -> int:
+        keys = [key for key in list(self.sessions.keys()) if key[0] == user]
+        for key in keys:
+            self.sessions.pop(key, None)
+        return len(keys)
+
+    def history(self, session: Optional[Session]) -> List[dict]:
+        if session is None:
+            return []
+        messages = []
+        if session.summary:
+            messages.append({"role": "system", "content": f"Tóm tắt cuộc trò chuyện trước: {session.summary}"})
+        return messages + session.turns
+
+    def append(self, session: Optional[Session], query: str, answer: str):
+        if session is None:
+            return
+        session.turns.append({"role": "user", "content": query})
+        session.turns.append({"role": "assistant", "content": answer})
+        session.tokens += estimate_tokens(query) + estimate_tokens(answer)
+        if session.tokens > self.token_budget or len(session.turns) > 2 * self.max_turns:
+            self.schedule(session)
+
+    def schedule(self, session: Session):
+        if session.compacting:
+            return
+        session.compacting = True
+        task = asyncio.create_task(self.compact(session))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def compact(self, session: Session):
+        """
+            Fold the oldest turns into the summary until half the budget is left, in one go
+            so the prefix changes once per compaction instead of on every turn
+        """
+        try:
+            cut, tokens = 0, session.tokens
+            while cut < len(session.turns) and (tokens > self.token_budget // 2 or len(session.turns) - cut > self.max_turns):
+                tokens -= sum(estimate_tokens(turn["content"]) for turn in session.turns[cut:cut + 2])
+                cut += 2
+            old = session.turns[:cut]
+            try:
+                session.summary = await self.summarize(session.summary, old)
+            except Exception as e:
+                # the turns are dropped anyway, losing them beats an unbounded prompt
+                log.warning("session summary failed: %r", e)
+            del session.turns[:cut]
+            session.tokens = sum(estimate_tokens(turn["content"]) for turn in session.turns)
+        finally:
+            session.compacting = False
+
+    async def summarize(self, summary: str, turns: List[dict]) -> str:
+        lines = [f"Tóm tắt trước đó: {summary}"] if summary else []
+        lines += [f"{'Người dùng' if turn['role'] == 'user' else 'Trợ lý'}: {turn['content']}" for turn in turns]
+        return await self.stage.run(
+            parse=lambda response: response.message.content.strip(),
+            confident=bool,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": "\n".join(lines)}
+            ]
+        )
+
+
+sessions = SessionStore()
@@ -0,0 +1,175 @@
+from ollama import ChatResponse, ResponseError
+from collections import Counter, defaultdict, deque
+from dotenv import load_dotenv
+from typing import Any, Callable, List
+from llm_service.client import llm_client
+from llm_service.scheduler import Priority, SchedulerRejected
+from llm_service.structured import output_format, STRUCTURED_RETRIES
+from common.timing import span
+from common.log import get_logger
+from common.metrics import ESCALATIONS
+import asyncio
+import httpx
+import time
+import os
+
+load_dotenv()
+
+log = get_logger(__name__)
+
+
+class ModelUnavailable(Exception):
+    def __init__(self, message: str, status_code: int, retry_after: float = 1):
+        """
+            The last model of a cascade timed out or Ollama failed, answered like SchedulerRejected
+        """
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def unavailable(error: Exception):
+    """
+        ModelUnavailable for a timeout (504) or an Ollama / connection error (503), None for anything else
+    """
+    if isinstance(error, (asyncio.TimeoutError, httpx.TimeoutException)):
+        return ModelUnavailable("Model did not answer in time, please try again later", 504)
+    if isinstance(error, (ResponseError, httpx.TransportError, ConnectionError)):
+        return ModelUnavailable("Model is unavailable, please try again later", 503)
+    return None
+
+
+def stage_config(name: str, models: str, timeout: float):
+    """
+        <NAME>_MODELS is a comma separated cascade, smallest model first, <NAME>_TIMEOUT is per attempt
+    """
+    env = name.upper()
+    models = [model.strip() for model in os.getenv(f"{env}_MODELS", models).split(",") if model.strip()]
+    return models, float(os.getenv(f"{env}_TIMEOUT", timeout))
+
+
+class Stage:
+    def __init__(self, name: str, models: List[str], timeout: float, priority: int, client=llm_client):
+        """
+            One step of a request (tool selection, classification, summary...) with its own models and timeout
+        """
+        self.name = name
+        self.models = models
+        self.timeout = timeout
+        self.priority = priority
+        self.client = client
+        self.calls = Counter()
+        self.failures = Counter()
+        self.escalations = 0
+        self.latencies = defaultdict(lambda: deque(maxlen=500))
+
+    def record(self, model: str, elapsed: float, ok: bool):
+        self.calls[model] += 1
+        if ok:
+            self.latencies[model].append(elapsed)
+        else:
+            self.failures[model] += 1
+
+    async def run(self, parse: Callable[[ChatResponse], Any] = None, confident: Callable[[Any], bool] = None,
+                  models: List[str] = None, schema: dict = None, **kwargs) -> Any:
+        """
+            Try the models smallest first, the next one takes over when the call fails or times out,
+            parse raises or confident says no. The last model's parsed answer is returned as is.
+            A schema constrains the output through Ollama's format and gives the last model
+            STRUCTURED_RETRIES more tries when parse raises ValueError
+        """
+        retries = 0
+        if schema is not None:
+            kwargs.setdefault("format", output_format(schema))
+            retries = STRUCTURED_RETRIES
+        with span(self.name):
+            return await self.cascade(parse, confident, models or self.models, retries, **kwargs)
+
+    async def cascade(self, parse, confident, models: List[str], retries: int = 0, **kwargs) -> Any:
+        for i, name in enumerate(models):
+            last = i == len(models) - 1
+            start = time.monotonic()
+            try:
+                response = await asyncio.wait_for(self.client.chat(priority=self.priority, model=name, **kwargs), self.timeout)
+                result = parse(response) if parse else response
+                if not last and confident is not None and not confident(result):
+                    raise ValueError("low confidence answer")
+            except SchedulerRejected:
+                raise
+            except Exception as e:
+                self.record(name, time.monotonic() - start, False)
+                if last and retries > 0 and isinstance(e, ValueError):
+                    # unparseable output, not a timeout: one more sample is cheaper than failing the request
+                    log.info("retry %s on %s (%r)", self.name, name, e)
+                    return await self.cascade(parse, confident, [name], retries - 1, **kwargs)
+                if last:
+                    error = unavailable(e)
+                    if error is not None:
+                        raise error from e
+                    raise
+                self.escalate(name, models[i + 1], e)
+                continue
+            self.record(name, time.monotonic() - start, True)
+            return result
+
+    def escalate(self, model: str, to: str, reason):
+        self.escalations += 1
+        ESCALATIONS.labels(self.name, model).inc()
+        log.info("escalate %s: %s -> %s (%r)", self.name, model, to, reason)
+
+    async def stream(self, model: str = None, schema: dict = None, **kwargs):
+        """
+            Stream from the first model only, a stream can not be handed over halfway
+        """
+        name = model or self.models[0]
+        if schema is not None:
+            kwargs.setdefault("format", output_format(schema))
+        start = time.monotonic()
+        ok = False
+        try:
+            with span(self.name):
+                async for chunk in self.client.chat_stream(priority=self.priority, model=name, **kwargs):
+                    yield chunk
+            ok = True
+        except Exception as e:
+            error = unavailable(e)
+            if error is not None:
+                raise error from e
+            raise
+        finally:
+            self.record(name, time.monotonic() - start, ok)
+
+    def stats(self) -> dict:
+        latency = {}
+        for model, values in self.latencies.items():
+            values = sorted(values)
+            latency[model] = {
+                "p50": values[len(values) // 2] if values else 0.0,
+                "p95": values[int(len(values) * 0.95)] if values else 0.0
+            }
+        return {
+            "models": self.models,
+            "timeout": self.timeout,
+            "calls": dict(self.calls),
+            "failures": dict(self.failures),
+            "escalations": self.escalations,
+            "latency": latency
+        }
+
+
+# tool selection, JSON classification and a short advice are fine on a small model, the summary reads better from the larger one
+routing = Stage("routing", *stage_config("routing", "qwen2.5:1.5b,qwen2.5:7b", 60), Priority.ROUTING)
+classify = Stage("classify", *stage_config("classify", "qwen2.5:1.5b,qwen2.5:7b", 60), Priority.CHAT)
+advice = Stage("advice", *stage_config("advice", "qwen2.5:1.5b,qwen2.5:7b", 60), Priority.CHAT)
+summary = Stage("summary", *stage_config("summary", "qwen2.5:7b", 120), Priority.SUMMARY)
+memory = Stage("memory", *stage_config("memory", "qwen2.5:1.5b,qwen2.5:7b", 120), Priority.BACKGROUND)
+
+stages = {stage.name: stage for stage in (routing, classify, advice, summary, memory)}
+
+
+def all_models() -> List[str]:
+    return list(dict.fromkeys(model for stage in stages.values() for model in stage.models))
+
+
+def stats() -> dict:
+    return {name: stage.stats() for name, stage in stages.items()}
@@ -0,0 +1,136 @@
+from dotenv import load_dotenv
+from typing import Any, Union
+from common.vietnamese import fold
+import orjson
+import math
+import re
+import os
+
+load_dotenv()
+
+# pass JSON schemas to Ollama as format, false falls back to format="json" for Ollama older than 0.5
+STRUCTURED_SCHEMA = os.getenv("STRUCTURED_SCHEMA", "true").lower() in ("1", "true", "yes")
+# extra attempts on the last model of a stage when its output can not be parsed or repaired
+STRUCTURED_RETRIES = int(os.getenv("STRUCTURED_RETRIES", 1))
+# longer output is not worth repairing, it is rejected as is
+STRUCTURED_MAX_CHARS = int(os.getenv("STRUCTURED_MAX_CHARS", 20000))
+
+FENCE_PATTERN = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+TRAILING_COMMA_PATTERN = re.compile(r",\s*([}\]])")
+
+
+def output_format(schema: dict) -> Union[dict, str]:
+    return schema if STRUCTURED_SCHEMA else "json"
+
+
+def close_truncated(text: str) -> str:
+    """
+        Close the string, arrays and objects left open by an answer cut at num_predict
+    """
+    stack, in_string, escaped = [], False, False
+    for c in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c in "{[":
+            stack.append("}" if c == "{" else "]")
+        elif c in "}]" and stack:
+            stack.pop()
+    if in_string:
+        text += '"'
+    return text.rstrip().rstrip(",") + "".join(reversed(stack))
+
+
+def loads(content: Union[str, bytes]) -> Any:
+    """
+        orjson first, then a fixed number of cheap repairs (code fences, text around the object,
+        trailing commas, truncation), a ValueError when none of them gives valid JSON
+    """
+    try:
+        return orjson.loads(content)
+    except orjson.JSONDecodeError as e:
+        error = e
+    text = content.decode() if isinstance(content, bytes) else content
+    if len(text) > STRUCTURED_MAX_CHARS:
+        raise ValueError(f"output of {len(text)} characters is not valid JSON") from error
+
+    text = FENCE_PATTERN.sub("", text)
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=0)
+    end = max(text.rfind("}"), text.rfind("]"))
+    for candidate in (text[start:end + 1], TRAILING_COMMA_PATTERN.sub(r"\1", text[start:end + 1]),
+                      close_truncated(TRAILING_COMMA_PATTERN.sub(r"\1", text[start:]))):
+        try:
+            return orjson.loads(candidate)
+        except orjson.JSONDecodeError:
+            continue
+    raise ValueError(f"invalid JSON output: {error}") from error
+
+
+def conform(data: Any, schema: dict) -> Any:
+    """
+        Check data against the subset of JSON schema the stages use (type, properties, required, enum,
+        maxLength, items, maxItems) for output that was not constrained by Ollama. Strings are cut to
+        maxLength, enums matched without diacritics and unknown properties dropped, anything else that
+        does not fit (including nan and infinite numbers) raises ValueError
+    """
+    kind = schema.get("type")
+    if kind == "object":
+        if not isinstance(data, dict):
+            raise ValueError(f"expected an object, got {type(data).__name__}")
+        properties = schema.get("properties", {})
+        missing = [key for key in schema.get("required", []) if key not in data]
+        if missing:
+            raise ValueError(f"missing {', '.join(missing)}")
+        if schema.get("additionalProperties", True) is False:
+            data = {key: value for key, value in data.items() if key in properties}
+        return {key: conform(value, properties[key]) if key in properties else value for key, value in data.items()}
+
+    if kind == "array":
+        if not isinstance(data, list):
+            raise ValueError(f"expected an array, got {type(data).__name__}")
+        data = data[:schema.get("maxItems", len(data))]
+        return [conform(item, schema["items"]) for item in data] if "items" in schema else data
+
+    if kind in ("number", "integer"):
+        if isinstance(data, bool):
+            raise ValueError("expected a number, got a boolean")
+        try:
+            number = float(data)
+        except (TypeError, ValueError):
+            raise ValueError(f"expected a number, got {data!r}") from None
+        # "nan", "inf" and "1e400" parse as floats, orjson would write them back as null
+        if not math.isfinite(number):
+            raise ValueError(f"expected a finite number, got {data!r}")
+        if kind == "integer":
+            if not number.is_integer():
+                raise ValueError(f"expected an integer, got {data!r}")
+            return int(number)
+        return number if isinstance(data, str) else data
+
+    if kind == "string":
+        if data is None:
+            data = ""
+        if not isinstance(data, str):
+            raise ValueError(f"expected a string, got {type(data).__name__}")
+        if "enum" in schema:
+            match = next((value for value in schema["enum"] if fold(value) == fold(data)), None)
+            if match is None:
+                raise ValueError(f"{data!r} is not one of {schema['enum']}")
+            return match
+        return data[:schema["maxLength"]] if "maxLength" in schema else data
+
+    return data
+
+
+def parse(content: Union[str, bytes], schema: dict) -> Any:
+    return conform(loads(content), schema)
+
+
+def dumps(data: Any) -> str:
+    return orjson.dumps(data).decode()
@@ -0,0 +1,118 @@
+from dotenv import load_dotenv
+from collections import Counter
+from typing import List, Tuple
+from llm_service.client import llm_client, OLLAMA_KEEP_ALIVE
+from llm_service.pool import Node
+from ollama import ResponseError
+from common.log import get_logger
+import asyncio
+import json
+import time
+import os
+
+load_dotenv()
+
+log = get_logger(__name__)
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+# also run each system prompt once so its prefix is in the node's prompt cache
+WARMUP_PROMPTS = os.getenv("WARMUP_PROMPTS", "true").lower() == "true"
+# prompt prefixes Ollama keeps per model, one per parallel slot (OLLAMA_NUM_PARALLEL on the nodes)
+WARMUP_SLOTS = int(os.getenv("WARMUP_SLOTS", 4))
+
+
+class Warmup:
+    def __init__(self, client=llm_client, keep_alive: str = OLLAMA_KEEP_ALIVE):
+        """
+            Load the models on every node before traffic arrives and pin them with keep_alive
+        """
+        self.pool = client.pool
+        self.keep_alive = keep_alive
+        self.models = []
+        self.prompts = []
+        self.ready = False
+        self.duration = None
+        self.errors = {}
+
+    def configure(self, models: List[str], prompts: List[Tuple[str, List[dict], dict]]):
+        """
+            prompts are (model, messages, extra chat arguments) as the real requests send them, in order of priority
+        """
+        self.models = list(dict.fromkeys(models))
+        # same format and options as the real request, one token is enough to fill the cache
+        self.prompts = [
+            (model, messages, {**kwargs, "options": {**kwargs.get("options", {}), "num_predict": 1}})
+            for model, messages, kwargs in self.select(prompts)
+        ]
+
+    @staticmethod
+    def select(prompts: List[Tuple[str, List[dict], dict]], slots: int = WARMUP_SLOTS):
+        """
+            Each slot of a model caches one prompt, warming more prefixes than there are slots only
+            evicts the earlier ones. Keep the first distinct prefixes of every model, up to slots
+        """
+        kept, seen, per_model = [], set(), Counter()
+        for model, messages, kwargs in prompts:
+            prefix = (model, json.dumps(messages[:-1], sort_keys=True))
+            if prefix in seen or per_model[model] >= slots:
+                continue
+            seen.add(prefix)
+            per_model[model] += 1
+            kept.append((model, messages, kwargs))
+        return kept
+
+    async def warm(self, node: Node):
+        start = time.monotonic()
+        try:
+            missing = set()
+            for model in self.models:
+                # a generate without prompt only loads the model
+                try:
+                    await node.client.generate(model=model, keep_alive=self.keep_alive)
+                except ResponseError as e:
+                    if e.status_code != 404:
+                        raise
+                    # not pulled on this node, the stages escalate past it
+                    missing.add(model)
+                    log.warning("warm-up %s: model %s not found", node.host, model)
+            if WARMUP_PROMPTS:
+                # at most one prompt per slot, sent together they land on different slots
+                await asyncio.gather(*(
+                    node.client.chat(
+                        model=model,
+                        messages=messages,
+                        keep_alive=self.keep_alive,
+                        **kwargs
+                    )
+                    for model, messages, kwargs in self.prompts if model not in missing
+                ))
+        except Exception as e:
+            self.errors[node.host] = repr(e)
+            log.error("warm-up of %s failed: %r", node.host, e)
+            # a cold node stays out of rotation, the next probe that reaches it warms it again
+            node.eject(e)
+            return False
+        self.errors.pop(node.host, None)
+        log.info("warm-up of %s done in %.1fs", node.host, time.monotonic() - start)
+        return True
+
+    async def run(self):
+        start = time.monotonic()
+        if WARMUP_ENABLED:
+            # set first, a node failing this warm-up must not be put back cold by the next probe
+            self.pool.on_restore = self.warm
+            await asyncio.gather(*(self.pool.rejoin(node) for node in self.pool.nodes))
+        self.duration = time.monotonic() - start
+        self.ready = True
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "duration": self.duration,
+            "models": self.models,
+            "prompts": len(self.prompts),
+            "errors": self.errors
+        }
+
+
+warmup = Warmup()
@@ -0,0 +1,46 @@
+from function_calling_service import aggregate, backend
+from function_calling_service.records import Expense
+import asyncio
+import pytest
+
+ROWS = [
+    {"amount": 100, "category": "ăn uống", "createdAt": "2025-03-02T10:00:00Z"},
+    {"amount": 50, "category": "ăn uống", "createdAt": "2025-03-20T10:00:00Z"},
+    {"amount": 200, "category": "mua sắm", "createdAt": "2025-04-01T10:00:00Z"},
+    {"amount": 30, "category": None, "createdAt": None},
+    {"amount": 20, "category": "mua sắm", "createdAt": "không phải ngày"},
+] * 7
+
+
+@pytest.fixture
+def clamped_backend(monkeypatch):
+    # like the real backend, never more than 10 rows a page whatever pageSize asks for
+    async def get_json(req, path, params=None, timeout=None):
+        size = min(params["pageSize"], 10)
+        start = (params["page"] - 1) * size
+        return {"metadata": {"Expenses": ROWS[start:start + size]}}
+    monkeypatch.setattr(backend, "get_json", get_json)
+
+
+def test_totals_walk_past_a_clamped_page(clamped_backend, monkeypatch):
+    monkeypatch.setattr(aggregate, "AGGREGATE_PAGE_SIZE", 100)
+    result = asyncio.run(aggregate.totals(None, {}, "category"))
+    assert result["transaction_count"] == len(ROWS)
+    assert result["total_amount"] == 400 * 7
+    assert result["totals"][0] == {"category": "mua sắm", "total_amount": 220 * 7, "transaction_count": 14}
+
+
+def test_total_by_date_leaves_out_undated_rows(clamped_backend):
+    result = asyncio.run(aggregate.totals(None, {}, "date", bucket="month"))
+    assert [item["date"] for item in result["totals"]] == ["2025-03", "2025-04"]
+    assert result["transaction_count"] == 21
+    assert result["undated_count"] == 14
+
+
+def test_pages_yield_compact_records(clamped_backend):
+    async def collect():
+        return [rows async for rows in backend.paginate_pages(None, "/expense/get-expense", {}, 10, 100)]
+
+    pages = asyncio.run(collect())
+    assert [len(rows) for rows in pages] == [10, 10, 10, 5]
+    assert pages[0][0] == Expense(100, "ăn uống", None)
@@ -0,0 +1,34 @@
+from api_gateway.auth import TokenVerifier
+import jwt
+import pytest
+import time
+
+SECRET = "secret"
+
+
+@pytest.mark.parametrize("claims, later, decoded", [
+    ({"exp": 60}, 10, 1),
+    ({"exp": 60}, 120, 2),
+    ({"nbf": -60}, 10, 1),
+    # clock stepped back before nbf, the cached entry alone would still accept the token
+    ({"nbf": -60}, -120, 2),
+    ({"exp": 60, "nbf": -60}, -120, 2),
+    ({}, 10 ** 6, 1),
+])
+def test_cache_hit_checks_exp_and_nbf(monkeypatch, claims, later, decoded):
+    now = time.time()
+    token = jwt.encode({"userId": "u1", **{key: int(now) + value for key, value in claims.items()}}, SECRET, algorithm="HS256")
+    verifier = TokenVerifier(SECRET)
+    verifier.verify(token)
+
+    calls = []
+    decode = jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        calls.append(1)
+        return decode(*args, options={"verify_exp": False, "verify_nbf": False}, **kwargs)
+
+    monkeypatch.setattr(jwt, "decode", counting_decode)
+    monkeypatch.setattr(time, "time", lambda: now + later)
+    assert verifier.verify(token)["userId"] == "u1"
+    assert 1 + len(calls) == decoded
@@ -0,0 +1,60 @@
+from chatbot_service.chat import Model
+from llm_service.scheduler import SchedulerRejected
+import asyncio
+import pytest
+
+
+class NoCache:
+    key = staticmethod(lambda *args: "|".join(args))
+
+    async def get(self, key):
+        return None
+
+    async def set(self, key, value):
+        pass
+
+
+def model_with(classify_pack) -> Model:
+    model = Model(None)
+    model.cache = NoCache()
+    model.classify_pack = classify_pack
+    return model
+
+
+def test_rejected_pack_cancels_the_others():
+    cancelled = []
+
+    async def classify_pack(pack, semaphore):
+        if pack[0] == "tin nhắn 0":
+            await asyncio.sleep(0.01)
+            raise SchedulerRejected("busy", 503)
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(pack[0])
+            raise
+        return {}
+
+    model = model_with(classify_pack)
+    queries = [f"tin nhắn {i}" for i in range(30)]
+
+    async def scenario():
+        with pytest.raises(SchedulerRejected):
+            await asyncio.wait_for(model.ask_batch(queries), 5)
+        # already cancelled when the error reaches the caller, not when the loop shuts down
+        assert cancelled
+
+    asyncio.run(scenario())
+
+
+def test_prompt_keeps_the_original_message():
+    prompted = []
+
+    async def classify_pack(pack, semaphore):
+        prompted.extend(pack)
+        return {i: {"description": query, "partner": query.split()[-1]} for i, query in enumerate(pack)}
+
+    model = model_with(classify_pack)
+    output = asyncio.run(model.ask_batch(["Gửi Nam", "gửi  nam", "Mua quà cho Lan"]))
+    assert prompted == ["Gửi Nam", "Mua quà cho Lan"]
+    assert [item["partner"] for item in output] == ["Nam", "Nam", "Lan"]
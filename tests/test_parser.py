@@ -0,0 +1,70 @@
+from chatbot_service.parser import CHAT_PARSER_THRESHOLD, parse_partner, parse_transaction
+import asyncio
+import pytest
+
+
+@pytest.mark.parametrize("query, partner", [
+    ("chuyển cho anh Nam 500k", "anh Nam"),
+    ("chuyển cho Nam 500k", "Nam"),
+    ("nhận 2tr từ bố", "bố"),
+    ("cho mẹ 500k", "mẹ"),
+    ("cho vay chị Lan 1tr", "chị Lan"),
+    ("chuyển cho Nguyễn Văn An Bình 1tr", "Nguyễn Văn An"),
+    ("tiền cho ăn 50k", None),
+    ("nhận lương từ hôm qua", None),
+    ("ăn phở 50k", None),
+])
+def test_partner(query, partner):
+    assert parse_partner(query) == partner
+
+
+@pytest.mark.parametrize("query, fields", [
+    ("ăn phở 50k", {"amount": 50000, "category": "ăn uống", "type": "gửi", "partner": ""}),
+    ("đổ xăng 50k", {"amount": 50000, "category": "di chuyển", "type": "gửi", "partner": ""}),
+    ("nhận lương 10tr", {"amount": 10000000, "category": "khác", "type": "nhận", "partner": ""}),
+    ("chuyển cho Nam 500k", {"amount": 500000, "category": "khác", "type": "gửi", "partner": "Nam"}),
+    ("nhận 2tr từ bố", {"amount": 2000000, "category": "khác", "type": "nhận", "partner": "bố"}),
+])
+def test_confident(query, fields):
+    parsed = parse_transaction(query)
+    assert parsed.confident, parsed.confidence
+    assert {key: parsed.fields()[key] for key in fields} == fields
+
+
+@pytest.mark.parametrize("query, field", [
+    ("ăn phở", "amount"),
+    ("ăn phở 50k rồi uống trà 20k", "amount"),
+    ("chuyển cho nam 500k", "partner"),
+    # có người giao dịch nhưng không có "cho"/"từ" để tách tên
+    ("trả anh Hùng 300k tiền ăn", "partner"),
+    ("chuyển Nam 200k", "partner"),
+    ("gửi mẹ 1tr", "partner"),
+    ("mua sách 120k", "category"),
+])
+def test_not_confident(query, field):
+    parsed = parse_transaction(query)
+    assert not parsed.confident
+    assert parsed.confidence[field] < CHAT_PARSER_THRESHOLD
+
+
+def test_batch_parses_the_original_message():
+    from chatbot_service.chat import Model
+
+    class NoCache:
+        key = staticmethod(lambda *args: "|".join(args))
+
+        async def get(self, key):
+            return None
+
+        async def set(self, key, value):
+            pass
+
+    async def no_llm(pack, semaphore):
+        return {}
+
+    model = Model(None)
+    model.cache = NoCache()
+    model.classify_pack = no_llm
+    output = asyncio.run(model.ask_batch(["chuyển cho Nam 500k", "Chuyển cho  Nam 500k"]))
+    assert [item.get("partner") for item in output] == ["Nam", "Nam"]
+    assert [item["description"] for item in output] == ["chuyển cho Nam 500k", "Chuyển cho  Nam 500k"]
@@ -0,0 +1,30 @@
+from function_calling_service.function import registry
+import pytest
+
+router = registry.router
+
+
+@pytest.mark.parametrize("query, name, parameters", [
+    ("10 giao dịch gần nhất", "function.get_expenses", {"pageSize": 10}),
+    ("chi tiêu gần đây", "function.get_expenses", {}),
+    ("chi tiêu lớn nhất", "function.get_max_expense", {}),
+    ("chi tieu lon nhat", "function.get_max_expense", {}),
+    ("giao dich nho nhat", "function.get_min_expense", {}),
+    ("tổng thu chi", "function.total_by_type", {}),
+    ("3 người tôi giao dịch nhiều nhất", "function.top_partners", {"limit": 3}),
+])
+def test_routed(query, name, parameters):
+    assert router.route(query) == [{"name": name, "parameters": parameters}]
+
+
+@pytest.mark.parametrize("query", [
+    # totals and superlatives the list tools would answer with one page of rows
+    "tổng chi tiêu năm nay",
+    "khoản chi nhỏ nhất tuần trước",
+    "giao dịch lớn nhất tháng trước",
+    # more rows than a page holds
+    "20 giao dịch gần nhất",
+    "chi tiêu mua sắm tháng 3",
+])
+def test_left_to_the_llm(query):
+    assert router.route(query) is None
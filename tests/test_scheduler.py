@@ -0,0 +1,97 @@
+from llm_service.scheduler import InferenceScheduler, Priority, SchedulerRejected
+import asyncio
+import pytest
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_queue_is_served_by_priority():
+    async def scenario():
+        scheduler = InferenceScheduler(max_concurrency=1, wait_budget=1e9)
+        order = []
+
+        async def job(priority, name):
+            async with scheduler.slot(priority, user=name):
+                order.append(name)
+
+        await scheduler.acquire(Priority.CHAT, "holder")
+        tasks = []
+        for priority, name in [(Priority.BACKGROUND, "memory"), (Priority.SUMMARY, "summary"),
+                               (Priority.ROUTING, "routing"), (Priority.CHAT, "chat")]:
+            tasks.append(asyncio.create_task(job(priority, name)))
+            await settle()
+        assert scheduler.queued == 4
+        scheduler.release("holder")
+        await asyncio.gather(*tasks)
+        return order, scheduler
+
+    order, scheduler = run(scenario())
+    assert order == ["routing", "chat", "summary", "memory"]
+    assert (scheduler.running, scheduler.queued, dict(scheduler.per_user)) == (0, 0, {})
+
+
+@pytest.mark.parametrize("limits, holders, queued, status, reason", [
+    # the per user limit counts queued requests, not only running ones
+    ({"max_concurrency": 1, "max_per_user": 2}, ["u"], ["u"], 429, "user_limit"),
+    ({"max_concurrency": 1, "max_queue": 2}, ["a"], ["b", "c"], 503, "queue_full"),
+    # a generation holds its slot about 2s by default, waiting behind one is over a 1s budget
+    ({"max_concurrency": 1, "wait_budget": 1}, ["a"], [], 503, "over_budget"),
+])
+def test_admission_rejects(limits, holders, queued, status, reason):
+    async def scenario():
+        scheduler = InferenceScheduler(**{"wait_budget": 1e9, **limits})
+        for user in holders:
+            await scheduler.acquire(Priority.CHAT, user)
+        waiting = [asyncio.create_task(scheduler.acquire(Priority.CHAT, user)) for user in queued]
+        await settle()
+        try:
+            with pytest.raises(SchedulerRejected) as rejected:
+                await scheduler.acquire(Priority.CHAT, "u")
+        finally:
+            for task in waiting:
+                task.cancel()
+            await asyncio.gather(*waiting, return_exceptions=True)
+        return rejected.value, scheduler
+
+    error, scheduler = run(scenario())
+    assert error.status_code == status
+    assert scheduler.rejected[reason] == 1
+    assert scheduler.queued == 0
+
+
+def test_queue_timeout_frees_the_waiter():
+    async def scenario():
+        scheduler = InferenceScheduler(max_concurrency=1, queue_timeout=0.05, wait_budget=1e9)
+        await scheduler.acquire(Priority.CHAT, "a")
+        with pytest.raises(SchedulerRejected) as rejected:
+            await scheduler.acquire(Priority.CHAT, "b")
+        return rejected.value, scheduler
+
+    error, scheduler = run(scenario())
+    assert error.status_code == 503
+    assert scheduler.queued == 0
+    assert dict(scheduler.per_user) == {"a": 1}
+
+
+def test_cancelled_waiter_does_not_leak_the_slot():
+    async def scenario():
+        scheduler = InferenceScheduler(max_concurrency=1, wait_budget=1e9)
+        await scheduler.acquire(Priority.CHAT, "a")
+        waiter = asyncio.create_task(scheduler.acquire(Priority.CHAT, "b"))
+        await settle()
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        scheduler.release("a")
+        # the slot is free again, not handed to the cancelled waiter
+        await asyncio.wait_for(scheduler.acquire(Priority.CHAT, "c"), 1)
+        return scheduler
+
+    scheduler = run(scenario())
+    assert (scheduler.running, scheduler.queued, dict(scheduler.per_user)) == (1, 0, {"c": 1})
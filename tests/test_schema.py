@@ -0,0 +1,67 @@
+from datetime import date
+from function_calling_service.schema import compile_arguments
+import pytest
+
+PARAMETERS = {
+    "type": "object",
+    "properties": {
+        "req": {"type": "Request"},
+        "amount": {"type": "number"},
+        "category": {"type": "string", "enum": ["ăn uống", "mua sắm", "khác"]},
+        "type": {"type": "string", "enum": ["gửi", "nhận"]},
+        "start": {"type": "date"},
+        "end": {"type": "date"},
+        "page": {"type": "int", "minium": 1, "default": 1},
+        "pageSize": {"type": "integer", "minimum": 1, "maximum": 10, "default": 5},
+    }
+}
+ACCEPTED = ["req", "amount", "category", "type", "start", "end", "page", "pageSize"]
+TODAY = date.today()
+
+coerce = compile_arguments(PARAMETERS, ["amount"], ACCEPTED)
+
+
+@pytest.mark.parametrize("arguments, expected, fixed", [
+    ({"amount": 50000}, {"amount": 50000.0, "page": 1, "pageSize": 5}, set()),
+    ({"amount": "50000"}, {"amount": 50000.0, "page": 1, "pageSize": 5}, set()),
+    ({"amount": "50k"}, {"amount": 50000.0, "page": 1, "pageSize": 5}, {"amount"}),
+    ({"amount": "1tr2"}, {"amount": 1200000.0, "page": 1, "pageSize": 5}, {"amount"}),
+    ({"amount": "100.000đ"}, {"amount": 100000.0, "page": 1, "pageSize": 5}, {"amount"}),
+    ({"amount": 1, "category": "An uong"}, {"amount": 1.0, "category": "ăn uống", "page": 1, "pageSize": 5}, {"category"}),
+    ({"amount": 1, "type": "chi"}, {"amount": 1.0, "type": "gửi", "page": 1, "pageSize": 5}, {"type"}),
+    ({"amount": 1, "type": "thu"}, {"amount": 1.0, "type": "nhận", "page": 1, "pageSize": 5}, {"type"}),
+    ({"amount": 1, "page": "2"}, {"amount": 1.0, "page": 2, "pageSize": 5}, set()),
+    ({"amount": 1, "page": "2.6"}, {"amount": 1.0, "page": 3, "pageSize": 5}, {"page"}),
+    ({"amount": 1, "page": 0}, {"amount": 1.0, "page": 1, "pageSize": 5}, {"page"}),
+    ({"amount": 1, "pageSize": 50}, {"amount": 1.0, "page": 1, "pageSize": 10}, {"pageSize"}),
+    ({"amount": 1, "start": "2025-03-01"}, {"amount": 1.0, "start": "2025-03-01", "page": 1, "pageSize": 5}, set()),
+    ({"amount": 1, "start": "1/3/2025"}, {"amount": 1.0, "start": "2025-03-01", "page": 1, "pageSize": 5}, {"start"}),
+    ({"amount": 1, "start": "tháng này", "end": "tháng này"},
+     {"amount": 1.0, "start": TODAY.replace(day=1).isoformat(), "end": TODAY.isoformat(), "page": 1, "pageSize": 5},
+     {"start", "end"}),
+    ({"amount": 1, "unknown": "x"}, {"amount": 1.0, "page": 1, "pageSize": 5}, set()),
+])
+def test_coerce(arguments, expected, fixed):
+    result, fixes = coerce(arguments)
+    assert result == expected
+    assert set(fixes) == fixed
+
+
+@pytest.mark.parametrize("arguments", [
+    {},
+    {"amount": ""},
+    {"amount": "abc"},
+    {"amount": "nan"},
+    {"amount": "inf"},
+    {"amount": "-inf"},
+    {"amount": "1e400"},
+    {"amount": float("nan")},
+    {"amount": float("inf")},
+    {"amount": 1, "page": "inf"},
+    {"amount": 1, "page": "nan"},
+    {"amount": 1, "category": "xe hơi"},
+    {"amount": 1, "start": "không phải ngày"},
+])
+def test_coerce_rejects(arguments):
+    with pytest.raises(ValueError):
+        coerce(arguments)
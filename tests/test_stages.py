@@ -0,0 +1,50 @@
+from common.metrics import ESCALATIONS
+from llm_service.stages import ModelUnavailable, Stage
+from ollama import ResponseError
+import asyncio
+import pytest
+
+
+class FailingClient:
+    def __init__(self, error):
+        self.error = error
+
+    async def chat(self, priority, model, **kwargs):
+        if self.error == "slow":
+            await asyncio.sleep(1)
+        raise self.error
+
+
+@pytest.mark.parametrize("error, status_code", [
+    ("slow", 504),
+    (ResponseError("model not found", 404), 503),
+    (ConnectionError("refused"), 503),
+])
+def test_last_model_failure_is_unavailable(error, status_code):
+    stage = Stage("test", ["small", "large"], 0.01, 0, client=FailingClient(error))
+    escalated = ESCALATIONS.labels("test", "small")._value.get()
+    with pytest.raises(ModelUnavailable) as raised:
+        asyncio.run(stage.run(messages=[]))
+    assert raised.value.status_code == status_code
+    assert stage.escalations == 1
+    assert ESCALATIONS.labels("test", "small")._value.get() == escalated + 1
+
+
+def test_other_errors_are_raised_as_is():
+    stage = Stage("test", ["small"], 1, 0, client=FailingClient(KeyError("message")))
+    with pytest.raises(KeyError):
+        asyncio.run(stage.run(messages=[]))
+
+
+def test_stream_failure_is_unavailable():
+    class Client:
+        async def chat_stream(self, priority, model, **kwargs):
+            raise ConnectionError("refused")
+            yield
+
+    async def consume():
+        return [chunk async for chunk in Stage("test", ["small"], 1, 0, client=Client()).stream(messages=[])]
+
+    with pytest.raises(ModelUnavailable) as raised:
+        asyncio.run(consume())
+    assert raised.value.status_code == 503
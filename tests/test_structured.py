@@ -0,0 +1,71 @@
+from llm_service.structured import STRUCTURED_MAX_CHARS, conform, loads
+import pytest
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "category": {"type": "string", "enum": ["ăn uống", "khác"]},
+        "amount": {"type": "number"},
+        "page": {"type": "integer"},
+        "advice": {"type": "string", "maxLength": 5},
+        "tags": {"type": "array", "items": {"type": "string"}, "maxItems": 2},
+    },
+    "required": ["category", "amount"],
+    "additionalProperties": False,
+}
+
+
+@pytest.mark.parametrize("content, expected", [
+    ('{"a": 1}', {"a": 1}),
+    (b'{"a": 1}', {"a": 1}),
+    ('```json\n{"a": 1}\n```', {"a": 1}),
+    ('Kết quả: {"a": 1} nhé', {"a": 1}),
+    ('{"a": 1, "b": [1, 2,],}', {"a": 1, "b": [1, 2]}),
+    ('{"a": "cắt giữa', {"a": "cắt giữa"}),
+    ('{"a": [{"b": 1}, {"c": 2', {"a": [{"b": 1}, {"c": 2}]}),
+    ('[1, 2', [1, 2]),
+])
+def test_loads_repairs(content, expected):
+    assert loads(content) == expected
+
+
+@pytest.mark.parametrize("content", [
+    "không phải JSON",
+    '{"a": }',
+    '{"a": 1' + " " * STRUCTURED_MAX_CHARS,
+])
+def test_loads_rejects(content):
+    with pytest.raises(ValueError):
+        loads(content)
+
+
+@pytest.mark.parametrize("data, expected", [
+    ({"category": "ăn uống", "amount": 50000}, {"category": "ăn uống", "amount": 50000}),
+    ({"category": "An Uong", "amount": "50000"}, {"category": "ăn uống", "amount": 50000.0}),
+    ({"category": "khác", "amount": 1, "page": 2.0}, {"category": "khác", "amount": 1, "page": 2}),
+    ({"category": "khác", "amount": 1, "advice": "quá dài"}, {"category": "khác", "amount": 1, "advice": "quá d"}),
+    ({"category": "khác", "amount": 1, "tags": ["a", "b", "c"]}, {"category": "khác", "amount": 1, "tags": ["a", "b"]}),
+    ({"category": "khác", "amount": 1, "extra": True}, {"category": "khác", "amount": 1}),
+])
+def test_conform(data, expected):
+    assert conform(data, SCHEMA) == expected
+
+
+@pytest.mark.parametrize("data", [
+    [],
+    {"category": "khác"},
+    {"category": "mua sắm", "amount": 1},
+    {"category": "khác", "amount": True},
+    {"category": "khác", "amount": "nhiều"},
+    {"category": "khác", "amount": 1, "page": 1.5},
+    {"category": "khác", "amount": "nan"},
+    {"category": "khác", "amount": "inf"},
+    {"category": "khác", "amount": "-Infinity"},
+    {"category": "khác", "amount": "1e400"},
+    {"category": "khác", "amount": float("nan")},
+    {"category": "khác", "amount": 1, "page": "inf"},
+    {"category": "khác", "amount": 1, "tags": "a"},
+])
+def test_conform_rejects(data):
+    with pytest.raises(ValueError):
+        conform(data, SCHEMA)